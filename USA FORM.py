@@ -1,267 +1,119 @@
 import streamlit as st
-import sqlite3
-import hashlib
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import os
 import re
-from PIL import Image
-import io
+import json
+import threading
+from collections import deque
 import pandas as pd
+import break_engine
+import db
+import fancy_number
+import fancy_scan
+import image_store
+from db import hash_password, resolve_mentions
+from fancy_number import is_fancy_number, is_fancy_number_batch
 
 # --------------------------
 # Database Functions
 # --------------------------
 
-def get_db_connection():
-    """Create and return a database connection."""
-    os.makedirs("data", exist_ok=True)
-    return sqlite3.connect("data/requests.db")
+SEARCH_RESULT_LIMIT = 100
+SETTINGS_CACHE_TTL = 2  # seconds
+MENTION_DIRECTORY_TTL = 300  # seconds
+NOTIFICATION_TOAST_LIMIT = 5
+HOLD_PAGE_SIZE = 10
+CHAT_REFRESH_SECONDS = 2
+CHAT_BUFFER_SIZE = 200
+CHAT_PAGE_SIZE = 50
+CHAT_RETENTION_DAYS = 30
+CHAT_ARCHIVE_CHUNK_SIZE = 500
+CHAT_ARCHIVE_INTERVAL = 24 * 60 * 60  # seconds
+BREAK_BOARD_REFRESH_SECONDS = 30
+BREAK_BOARD_LOOKAHEAD_MINUTES = 15
+# Above every real message id, i.e. "start at the newest"
+LATEST_MESSAGE_ID = 2 ** 63 - 1
+RECENT_MISTAKES_HOURS = 24
+REQUESTS_PAGE_SIZE = 25
+DASHBOARD_CACHE_ENTRIES = 64
+FANCY_SCAN_REFRESH_SECONDS = 2
+FANCY_SEARCH_LIMIT = 500
+REQUESTS_PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+# (start, end) created_at bounds meaning "no date filter"
+ALL_TIME = (0, 2 ** 63 - 1)
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+def get_db_connection():
+    """Return this thread's pooled database connection (close() releases it)."""
+    return db.get_connection()
+
+def now_stamps():
+    """(TEXT timestamp, epoch seconds) for a row written now."""
+    now = datetime.now()
+    return now.strftime("%Y-%m-%d %H:%M:%S"), int(now.timestamp())
+
+def epoch_range(start_date=None, end_date=None):
+    """created_at bounds [start, end) covering whole local days; open ends mean all time."""
+    start = int(datetime.combine(start_date, time.min).timestamp()) if start_date else ALL_TIME[0]
+    end = int(datetime.combine(end_date + timedelta(days=1), time.min).timestamp()) if end_date else ALL_TIME[1]
+    return start, end
+
+def date_range_filter(key, label="Date range"):
+    """Optional date-range picker; returns created_at bounds for the list queries."""
+    picked = st.date_input(label, value=(), key=key)
+    if not picked:
+        return ALL_TIME
+    # A single date while the second one is still being chosen
+    return epoch_range(picked[0], picked[-1])
 
 def authenticate(username, password):
+    """Return (user_id, username, role) with the stored spelling of the name, or None."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         hashed_password = hash_password(password)
-        cursor.execute("SELECT role FROM users WHERE LOWER(username) = LOWER(?) AND password = ?", 
+        cursor.execute("SELECT id, username, role FROM users WHERE username = ? COLLATE NOCASE AND password = ?",
                       (username, hashed_password))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        return cursor.fetchone()
     finally:
         conn.close()
 
 def init_db():
+    """Apply pending schema migrations; a no-op after the first call in this process."""
+    db.migrate()
+
+@st.cache_data(ttl=SETTINGS_CACHE_TTL, show_spinner=False)
+def get_system_settings():
+    """Snapshot of system_settings shared by every session in this process.
+
+    Toggles made here clear it immediately; changes written by another
+    process show up within SETTINGS_CACHE_TTL seconds.
+    """
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        
-        # Create tables if they don't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE,
-                password TEXT,
-                role TEXT CHECK(role IN ('agent', 'admin')))
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_name TEXT,
-                request_type TEXT,
-                identifier TEXT,
-                comment TEXT,
-                timestamp TEXT,
-                completed INTEGER DEFAULT 0)
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS mistakes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                team_leader TEXT,
-                agent_name TEXT,
-                ticket_id TEXT,
-                error_description TEXT,
-                timestamp TEXT)
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS group_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sender TEXT,
-                message TEXT,
-                timestamp TEXT,
-                mentions TEXT)
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS hold_images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                uploader TEXT,
-                image_data BLOB,
-                timestamp TEXT)
-        """)
-        
-        # Handle system_settings table schema migration
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='system_settings'")
-        if not cursor.fetchone():
-            cursor.execute("""
-                CREATE TABLE system_settings (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    killswitch_enabled INTEGER DEFAULT 0,
-                    chat_killswitch_enabled INTEGER DEFAULT 0)
-            """)
-            cursor.execute("INSERT INTO system_settings (id, killswitch_enabled, chat_killswitch_enabled) VALUES (1, 0, 0)")
-        else:
-            cursor.execute("PRAGMA table_info(system_settings)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'chat_killswitch_enabled' not in columns:
-                cursor.execute("ALTER TABLE system_settings ADD COLUMN chat_killswitch_enabled INTEGER DEFAULT 0")
-                cursor.execute("UPDATE system_settings SET chat_killswitch_enabled = 0 WHERE id = 1")
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS breaks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                break_name TEXT,
-                start_time TEXT,
-                end_time TEXT,
-                max_users INTEGER,
-                current_users INTEGER DEFAULT 0,
-                created_by TEXT,
-                timestamp TEXT)
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS break_bookings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                break_id INTEGER,
-                user_id INTEGER,
-                username TEXT,
-                booking_date TEXT,
-                timestamp TEXT,
-                FOREIGN KEY(break_id) REFERENCES breaks(id))
-        """)
-        
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS request_comments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                request_id INTEGER,
-                user TEXT,
-                comment TEXT,
-                timestamp TEXT,
-                FOREIGN KEY(request_id) REFERENCES requests(id))
+            SELECT killswitch_enabled, chat_killswitch_enabled, max_agents_on_break
+            FROM system_settings WHERE id = 1
         """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS late_logins (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_name TEXT,
-                presence_time TEXT,
-                login_time TEXT,
-                reason TEXT,
-                timestamp TEXT)
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS quality_issues (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_name TEXT,
-                issue_type TEXT,
-                timing TEXT,
-                mobile_number TEXT,
-                product TEXT,
-                timestamp TEXT)
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS midshift_issues (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_name TEXT,
-                issue_type TEXT,
-                start_time TEXT,
-                end_time TEXT,
-                timestamp TEXT)
-        """)
-        
-        # Create default admin account
-        cursor.execute("""
-            INSERT OR IGNORE INTO users (username, password, role) 
-            VALUES (?, ?, ?)
-        """, ("taha kirri", hash_password("arise@99"), "admin"))
-        admin_accounts = [
-            ("taha kirri", "arise@99"),
-            ("Issam Samghini", "admin@2025"),
-            ("Loubna Fellah", "admin@99"),
-            ("Youssef Kamal", "admin@006"),
-            ("Fouad Fathi", "admin@55")
-        ]
-        
-        for username, password in admin_accounts:
-            cursor.execute("""
-                INSERT OR IGNORE INTO users (username, password, role) 
-                VALUES (?, ?, ?)
-            """, (username, hash_password(password), "admin"))
-        
-        # Create agent accounts (agent name as username, workspace ID as password)
-        agents = [
-            ("Karabila Younes", "30866"),
-            ("Kaoutar Mzara", "30514"),
-            ("Ben Tahar Chahid", "30864"),
-            ("Cherbassi Khadija", "30868"),
-            ("Lekhmouchi Kamal", "30869"),
-            ("Said Kilani", "30626"),
-            ("AGLIF Rachid", "30830"),
-            ("Yacine Adouha", "30577"),
-            ("Manal Elanbi", "30878"),
-            ("Jawad Ouassaddine", "30559"),
-            ("Kamal Elhaouar", "30844"),
-            ("Hoummad Oubella", "30702"),
-            ("Zouheir Essafi", "30703"),
-            ("Anwar Atifi", "30781"),
-            ("Said Elgaouzi", "30782"),
-            ("HAMZA SAOUI", "30716"),
-            ("Ibtissam Mazhari", "30970"),
-            ("Imad Ghazali", "30971"),
-            ("Jamila Lahrech", "30972"),
-            ("Nassim Ouazzani Touhami", "30973"),
-            ("Salaheddine Chaggour", "30974"),
-            ("Omar Tajani", "30711"),
-            ("Nizar Remz", "30728"),
-            ("Abdelouahed Fettah", "30693"),
-            ("Amal Bouramdane", "30675"),
-            ("Fatima Ezzahrae Oubaalla", "30513"),
-            ("Redouane Bertal", "30643"),
-            ("Abdelouahab Chenani", "30789"),
-            ("Imad El Youbi", "30797"),
-            ("Youssef Hammouda", "30791"),
-            ("Anas Ouassifi", "30894"),
-            ("SALSABIL ELMOUSS", "30723"),
-            ("Hicham Khalafa", "30712"),
-            ("Ghita Adib", "30710"),
-            ("Aymane Msikila", "30722"),
-            ("Marouane Boukhadda", "30890"),
-            ("Hamid Boulatouan", "30899"),
-            ("Bouchaib Chafiqi", "30895"),
-            ("Houssam Gouaalla", "30891"),
-            ("Abdellah Rguig", "30963"),
-            ("Abdellatif Chatir", "30964"),
-            ("Abderrahman Oueto", "30965"),
-            ("Fatiha Lkamel", "30967"),
-            ("Abdelhamid Jaber", "30708"),
-            ("Yassine Elkanouni", "30735")
-        ]
-        
-        for agent_name, workspace_id in agents:
-            cursor.execute("""
-                INSERT OR IGNORE INTO users (username, password, role) 
-                VALUES (?, ?, ?)
-            """, (agent_name, hash_password(workspace_id), "agent"))
-        
-        conn.commit()
+        result = cursor.fetchone()
+        killswitch, chat_killswitch, max_agents_on_break = result if result else (0, 0, None)
+        return {
+            "killswitch_enabled": bool(killswitch),
+            "chat_killswitch_enabled": bool(chat_killswitch),
+            "max_agents_on_break": max_agents_on_break
+        }
     finally:
         conn.close()
 
 def is_killswitch_enabled():
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT killswitch_enabled FROM system_settings WHERE id = 1")
-        result = cursor.fetchone()
-        return bool(result[0]) if result else False
-    finally:
-        conn.close()
+    return get_system_settings()["killswitch_enabled"]
 
 def is_chat_killswitch_enabled():
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT chat_killswitch_enabled FROM system_settings WHERE id = 1")
-        result = cursor.fetchone()
-        return bool(result[0]) if result else False
-    finally:
-        conn.close()
+    return get_system_settings()["chat_killswitch_enabled"]
+
+def get_max_agents_on_break():
+    """The floor's limit on agents on break at once, or None when there is none."""
+    return get_system_settings()["max_agents_on_break"]
 
 def toggle_killswitch(enable):
     conn = get_db_connection()
@@ -270,6 +122,7 @@ def toggle_killswitch(enable):
         cursor.execute("UPDATE system_settings SET killswitch_enabled = ? WHERE id = 1",
                       (1 if enable else 0,))
         conn.commit()
+        get_system_settings.clear()
         return True
     finally:
         conn.close()
@@ -281,6 +134,19 @@ def toggle_chat_killswitch(enable):
         cursor.execute("UPDATE system_settings SET chat_killswitch_enabled = ? WHERE id = 1",
                       (1 if enable else 0,))
         conn.commit()
+        get_system_settings.clear()
+        return True
+    finally:
+        conn.close()
+
+def set_max_agents_on_break(limit):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE system_settings SET max_agents_on_break = ? WHERE id = 1",
+                      (limit or None,))
+        conn.commit()
+        get_system_settings.clear()
         return True
     finally:
         conn.close()
@@ -293,11 +159,11 @@ def add_request(agent_name, request_type, identifier, comment):
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp, created_at = now_stamps()
         cursor.execute("""
-            INSERT INTO requests (agent_name, request_type, identifier, comment, timestamp) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (agent_name, request_type, identifier, comment, timestamp))
+            INSERT INTO requests (agent_name, request_type, identifier, comment, timestamp, created_at) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (agent_name, request_type, identifier, comment, timestamp, created_at))
         
         request_id = cursor.lastrowid
         
@@ -311,28 +177,128 @@ def add_request(agent_name, request_type, identifier, comment):
     finally:
         conn.close()
 
-def get_requests():
+def get_data_version(name):
+    """Counter bumped by triggers whenever ``name``'s rollups change."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM requests ORDER BY timestamp DESC")
-        return cursor.fetchall()
+        cursor.execute("SELECT version FROM data_versions WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+def get_request_day_range():
+    """(first day, last day) with any requests, or (None, None)."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT (SELECT MIN(day) FROM daily_request_rollup),
+                   (SELECT MAX(day) FROM daily_request_rollup)
+        """)
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+@st.cache_data(max_entries=DASHBOARD_CACHE_ENTRIES, show_spinner=False)
+def get_dashboard_metrics(start_day, end_day, version):
+    """Dashboard numbers for ``start_day``..``end_day`` from the daily rollup.
+
+    ``version`` is only part of the cache key: a new data version means new
+    numbers, the same version is served from the cache.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT day, SUM(total), SUM(completed)
+            FROM daily_request_rollup
+            WHERE day BETWEEN ? AND ?
+            GROUP BY day
+            ORDER BY day
+        """, (start_day, end_day))
+        per_day = cursor.fetchall()
+        cursor.execute("""
+            SELECT request_type, SUM(total)
+            FROM daily_request_rollup
+            WHERE day BETWEEN ? AND ?
+            GROUP BY request_type
+            ORDER BY SUM(total) DESC
+        """, (start_day, end_day))
+        per_type = cursor.fetchall()
+    finally:
+        conn.close()
+    total = sum(row[1] for row in per_day)
+    completed = sum(row[2] for row in per_day)
+    return {
+        "total": total,
+        "completed": completed,
+        "rate": (completed / total * 100) if total > 0 else 0,
+        "per_day": per_day,
+        "per_type": per_type,
+    }
+
+def get_requests_page(completed=None, after=None, limit=REQUESTS_PAGE_SIZE, created_range=ALL_TIME):
+    """One page of requests, newest first, keyset-paginated on (created_at, id).
+
+    ``after`` is the (created_at, id) of the last row on the previous page,
+    ``completed`` optionally filters on status and ``created_range`` is a
+    [start, end) epoch window. Returns (rows, next_position); next_position
+    is None on the last page.
+    """
+    start, end = created_range
+    position = after or (end, 0)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if completed is None:
+            cursor.execute("""
+                SELECT id, agent_name, request_type, identifier, comment, timestamp, completed,
+                       comment_count, last_comment_at, created_at
+                FROM requests
+                WHERE created_at >= ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (start, *position, limit + 1))
+        else:
+            cursor.execute("""
+                SELECT id, agent_name, request_type, identifier, comment, timestamp, completed,
+                       comment_count, last_comment_at, created_at
+                FROM requests
+                WHERE completed = ? AND created_at >= ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (1 if completed else 0, start, *position, limit + 1))
+        rows = cursor.fetchall()
     finally:
         conn.close()
+    next_position = (rows[limit - 1][9], rows[limit - 1][0]) if len(rows) > limit else None
+    return [row[:9] for row in rows[:limit]], next_position
+
+def build_fts_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    terms = re.findall(r"\w+", text)
+    return " AND ".join(f'"{term}"*' for term in terms)
 
 def search_requests(query):
+    """Rank requests by bm25; rows match get_requests_page() plus a highlighted snippet."""
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return []
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        query = f"%{query.lower()}%"
         cursor.execute("""
-            SELECT * FROM requests 
-            WHERE LOWER(agent_name) LIKE ? 
-            OR LOWER(request_type) LIKE ? 
-            OR LOWER(identifier) LIKE ? 
-            OR LOWER(comment) LIKE ?
-            ORDER BY timestamp DESC
-        """, (query, query, query, query))
+            SELECT r.id, r.agent_name, r.request_type, r.identifier, r.comment, r.timestamp,
+                   r.completed, r.comment_count, r.last_comment_at,
+                   snippet(requests_fts, -1, '<mark>', '</mark>', '…', 12)
+            FROM requests_fts
+            JOIN requests r ON r.id = requests_fts.rowid
+            WHERE requests_fts MATCH ?
+            ORDER BY bm25(requests_fts, 1.0, 0.5, 2.0, 1.0)
+            LIMIT ?
+        """, (fts_query, SEARCH_RESULT_LIMIT))
         return cursor.fetchall()
     finally:
         conn.close()
@@ -382,6 +348,25 @@ def get_request_comments(request_id):
     finally:
         conn.close()
 
+def get_comments_for_requests(request_ids):
+    """Load the comment threads of several requests in one query, keyed by request id."""
+    threads = {request_id: [] for request_id in request_ids}
+    if not threads:
+        return threads
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM request_comments
+            WHERE request_id IN (SELECT value FROM json_each(?))
+            ORDER BY request_id, timestamp ASC
+        """, (json.dumps(list(threads)),))
+        for comment in cursor.fetchall():
+            threads[comment[1]].append(comment)
+        return threads
+    finally:
+        conn.close()
+
 def add_mistake(team_leader, agent_name, ticket_id, error_description):
     if is_killswitch_enabled():
         st.error("System is currently locked. Please contact the developer.")
@@ -391,36 +376,56 @@ def add_mistake(team_leader, agent_name, ticket_id, error_description):
     try:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO mistakes (team_leader, agent_name, ticket_id, error_description, timestamp) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (team_leader, agent_name, ticket_id, error_description,
-             datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            INSERT INTO mistakes (team_leader, agent_name, ticket_id, error_description, timestamp, created_at) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (team_leader, agent_name, ticket_id, error_description, *now_stamps()))
         conn.commit()
         return True
     finally:
         conn.close()
 
-def get_mistakes():
+def get_mistakes(created_range=ALL_TIME):
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM mistakes ORDER BY timestamp DESC")
+        cursor.execute("""
+            SELECT id, team_leader, agent_name, ticket_id, error_description, timestamp
+            FROM mistakes
+            WHERE created_at >= ? AND created_at < ?
+            ORDER BY created_at DESC, id DESC
+        """, created_range)
         return cursor.fetchall()
     finally:
         conn.close()
 
 def search_mistakes(query):
+    """Rank mistakes by bm25; each row is the mistake columns plus a highlighted snippet."""
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return []
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        query = f"%{query.lower()}%"
         cursor.execute("""
-            SELECT * FROM mistakes 
-            WHERE LOWER(agent_name) LIKE ? 
-            OR LOWER(ticket_id) LIKE ? 
-            OR LOWER(error_description) LIKE ?
-            ORDER BY timestamp DESC
-        """, (query, query, query))
+            SELECT m.id, m.team_leader, m.agent_name, m.ticket_id, m.error_description, m.timestamp,
+                   snippet(mistakes_fts, -1, '<mark>', '</mark>', '…', 12)
+            FROM mistakes_fts
+            JOIN mistakes m ON m.id = mistakes_fts.rowid
+            WHERE mistakes_fts MATCH ?
+            ORDER BY bm25(mistakes_fts, 1.0, 2.0, 1.0)
+            LIMIT ?
+        """, (fts_query, SEARCH_RESULT_LIMIT))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+@st.cache_data(ttl=MENTION_DIRECTORY_TTL, show_spinner=False)
+def get_mention_directory():
+    """(id, username) of every user, for resolving @mentions at write time."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, username FROM users")
         return cursor.fetchall()
     finally:
         conn.close()
@@ -430,29 +435,195 @@ def send_group_message(sender, message):
         st.error("Chat is currently locked. Please contact the developer.")
         return False
         
+    mentioned = resolve_mentions(message, get_mention_directory())
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        mentions = re.findall(r'@(\w+)', message)
         cursor.execute("""
-            INSERT INTO group_messages (sender, message, timestamp, mentions) 
-            VALUES (?, ?, ?, ?)
-        """, (sender, message, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-             ','.join(mentions)))
+            INSERT INTO group_messages (sender, message, timestamp, created_at, mentions) 
+            VALUES (?, ?, ?, ?, ?)
+        """, (sender, message, *now_stamps(), ','.join(username for _, username in mentioned)))
+        message_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT OR IGNORE INTO message_mentions (message_id, user_id)
+            VALUES (?, ?)
+        """, [(message_id, user_id) for user_id, _ in mentioned])
         conn.commit()
         return True
     finally:
         conn.close()
 
-def get_group_messages():
+def get_group_messages(user_id=None, before_id=LATEST_MESSAGE_ID, limit=CHAT_PAGE_SIZE):
+    """A page of messages below ``before_id``, newest first; the last column flags mentions of ``user_id``."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT gm.id, gm.sender, gm.message, gm.timestamp, gm.mentions,
+                   EXISTS (SELECT 1 FROM message_mentions mm
+                           WHERE mm.message_id = gm.id AND mm.user_id = ?)
+            FROM group_messages gm
+            WHERE gm.id < ?
+            ORDER BY gm.id DESC
+            LIMIT ?
+        """, (user_id, before_id, limit))
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+def get_archived_group_messages(before_id, username=None, limit=CHAT_PAGE_SIZE):
+    """Like get_group_messages, but read from the compressed archive chunks."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT payload FROM group_message_archive
+            WHERE first_id < ?
+            ORDER BY first_id DESC
+        """, (before_id,))
+        messages = []
+        for (payload,) in cursor:
+            for msg_id, sender, message, ts, mentions in reversed(db.unpack_messages(payload)):
+                if msg_id < before_id:
+                    is_mentioned = bool(username) and username.lower() in (mentions or "").lower().split(",")
+                    messages.append((msg_id, sender, message, ts, mentions, int(is_mentioned)))
+                    if len(messages) == limit:
+                        return messages
+        return messages
+    finally:
+        conn.close()
+
+def get_older_group_messages(before_id, user_id=None, username=None, limit=CHAT_PAGE_SIZE):
+    """The page before ``before_id``, newest first, continuing into the archive once the live table runs out."""
+    messages = get_group_messages(user_id, before_id, limit)
+    if len(messages) < limit:
+        oldest = messages[-1][0] if messages else before_id
+        messages += get_archived_group_messages(oldest, username, limit - len(messages))
+    return messages
+
+def archive_group_messages(retention_days=CHAT_RETENTION_DAYS):
+    """Move messages older than ``retention_days`` into compressed archive chunks; returns how many."""
+    cutoff = int((datetime.now() - timedelta(days=retention_days)).timestamp())
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Ids grow with time, so everything below the first recent message is old
+        cursor.execute("SELECT MIN(id) FROM group_messages WHERE created_at >= ?", (cutoff,))
+        boundary = cursor.fetchone()[0] or LATEST_MESSAGE_ID
+        archived = 0
+        while True:
+            cursor.execute("""
+                SELECT id, sender, message, timestamp, mentions FROM group_messages
+                WHERE id < ?
+                ORDER BY id
+                LIMIT ?
+            """, (boundary, CHAT_ARCHIVE_CHUNK_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            first_id, last_id = rows[0][0], rows[-1][0]
+            cursor.execute("""
+                INSERT INTO group_message_archive
+                    (first_id, last_id, first_timestamp, last_timestamp, message_count, payload)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (first_id, last_id, rows[0][3], rows[-1][3], len(rows), db.pack_messages(rows)))
+            cursor.execute("DELETE FROM message_mentions WHERE message_id BETWEEN ? AND ?", (first_id, last_id))
+            cursor.execute("DELETE FROM group_messages WHERE id BETWEEN ? AND ?", (first_id, last_id))
+            conn.commit()  # one chunk per transaction keeps the write lock short
+            archived += len(rows)
+        return archived
+    finally:
+        conn.close()
+
+@st.cache_resource(ttl=CHAT_ARCHIVE_INTERVAL, show_spinner=False)
+def run_daily_chat_archive():
+    """Apply chat retention at most once a day per server process, off the request thread."""
+    thread = threading.Thread(target=archive_group_messages, name="chat-archive", daemon=True)
+    thread.start()
+    return thread
+
+def get_chat_archive_stats():
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*), IFNULL(SUM(message_count), 0), IFNULL(SUM(LENGTH(payload)), 0)
+            FROM group_message_archive
+        """)
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+def get_new_group_messages(after_id, user_id=None, limit=NOTIFICATION_TOAST_LIMIT):
+    """Messages with id > after_id, oldest first (a primary-key range read)."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM group_messages ORDER BY timestamp DESC LIMIT 50")
+        cursor.execute("""
+            SELECT gm.id, gm.sender, gm.message, gm.timestamp, gm.mentions,
+                   EXISTS (SELECT 1 FROM message_mentions mm
+                           WHERE mm.message_id = gm.id AND mm.user_id = ?)
+            FROM group_messages gm
+            WHERE gm.id > ?
+            ORDER BY gm.id ASC
+            LIMIT ?
+        """, (user_id, after_id, limit))
         return cursor.fetchall()
     finally:
         conn.close()
 
+def mark_mentions_seen(user_id, up_to_message_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE message_mentions SET seen = 1
+            WHERE user_id = ? AND seen = 0 AND message_id <= ?
+        """, (user_id, up_to_message_id))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+def get_activity_counters(username, user_id=None, since_request_id=0, since_mistake_id=0,
+                          read_message_id=0):
+    """Every notification counter in one query.
+
+    New-item counts are primary-key range reads above the caller's
+    high-water marks, so the cost does not grow with table size.
+    """
+    recent_since = int((datetime.now() - timedelta(hours=RECENT_MISTAKES_HOURS)).timestamp())
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                (SELECT IFNULL(MAX(id), 0) FROM requests),
+                (SELECT COUNT(*) FROM requests WHERE id > ?),
+                (SELECT COUNT(*) FROM requests WHERE completed = 0),
+                (SELECT IFNULL(MAX(id), 0) FROM mistakes),
+                (SELECT COUNT(*) FROM mistakes WHERE id > ?),
+                (SELECT COUNT(*) FROM mistakes WHERE created_at >= ?),
+                (SELECT IFNULL(MAX(id), 0) FROM group_messages),
+                (SELECT COUNT(*) FROM group_messages WHERE id > ? AND sender != ?),
+                (SELECT COUNT(*) FROM message_mentions WHERE user_id = ? AND seen = 0)
+        """, (since_request_id, since_mistake_id, recent_since, read_message_id, username, user_id))
+        (max_request_id, new_requests, pending_requests, max_mistake_id, new_mistakes,
+         recent_mistakes, max_message_id, unread_messages, unread_mentions) = cursor.fetchone()
+        return {
+            "max_request_id": max_request_id,
+            "new_requests": new_requests,
+            "pending_requests": pending_requests,
+            "max_mistake_id": max_mistake_id,
+            "new_mistakes": new_mistakes,
+            "recent_mistakes": recent_mistakes,
+            "max_message_id": max_message_id,
+            "unread_messages": unread_messages,
+            "unread_mentions": unread_mentions
+        }
+    finally:
+        conn.close()
+
 def get_all_users():
     conn = get_db_connection()
     try:
@@ -473,6 +644,7 @@ def add_user(username, password, role):
         cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
                       (username, hash_password(password), role))
         conn.commit()
+        get_mention_directory.clear()
         return True
     finally:
         conn.close()
@@ -486,7 +658,9 @@ def delete_user(user_id):
     try:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        cursor.execute("DELETE FROM message_mentions WHERE user_id = ?", (user_id,))
         conn.commit()
+        get_mention_directory.clear()
         return True
     finally:
         conn.close()
@@ -496,23 +670,31 @@ def add_hold_image(uploader, image_data):
         st.error("System is currently locked. Please contact the developer.")
         return False
         
+    digest = image_store.get_store().put(image_data)
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
+        # Identical uploads share one stored file; each upload still gets its own row
         cursor.execute("""
-            INSERT INTO hold_images (uploader, image_data, timestamp) 
-            VALUES (?, ?, ?)
-        """, (uploader, image_data, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            INSERT INTO hold_images (uploader, sha256, size_bytes, timestamp) 
+            VALUES (?, ?, ?, ?)
+        """, (uploader, digest, len(image_data), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
         conn.commit()
+        image_store.submit_variants(digest)
         return True
     finally:
         conn.close()
 
-def get_hold_images():
+def get_hold_images(limit=HOLD_PAGE_SIZE):
+    """Newest HOLD image metadata; bytes stay on disk until an image is shown."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM hold_images ORDER BY timestamp DESC")
+        cursor.execute("""
+            SELECT id, uploader, sha256, size_bytes, timestamp FROM hold_images
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (limit,))
         return cursor.fetchall()
     finally:
         conn.close()
@@ -527,6 +709,8 @@ def clear_hold_images():
         cursor = conn.cursor()
         cursor.execute("DELETE FROM hold_images")
         conn.commit()
+        cursor.execute("SELECT sha256 FROM hold_images")
+        image_store.get_store().garbage_collect({digest for (digest,) in cursor.fetchall()})
         return True
     finally:
         conn.close()
@@ -569,6 +753,8 @@ def clear_all_group_messages():
     try:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM group_messages")
+        cursor.execute("DELETE FROM message_mentions")
+        cursor.execute("DELETE FROM group_message_archive")
         conn.commit()
         return True
     finally:
@@ -619,41 +805,65 @@ def get_all_break_slots():
     finally:
         conn.close()
 
-def get_available_break_slots(date):
+def get_break_slot_availability(date, user_id=None):
+    """Every slot with its remaining seats on ``date`` and whether ``user_id`` holds one."""
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT b.* 
-            FROM breaks b
-            LEFT JOIN (
-                SELECT break_id, COUNT(*) as booking_count
-                FROM break_bookings 
-                WHERE booking_date = ?
-                GROUP BY break_id
-            ) bb ON b.id = bb.break_id
-            WHERE b.max_users > IFNULL(bb.booking_count, 0)
-            ORDER BY b.start_time
-        """, (date,))
-        return cursor.fetchall()
+        return break_engine.slot_availability(conn, date, user_id)
     finally:
         conn.close()
 
 def book_break_slot(break_id, user_id, username, booking_date):
+    """Atomically book a seat; returns a break_engine status, or None while locked."""
     if is_killswitch_enabled():
         st.error("System is currently locked. Please contact the developer.")
-        return False
+        return None
         
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO break_bookings (break_id, user_id, username, booking_date, timestamp) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (break_id, user_id, username, booking_date,
-             datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-        return True
+        return break_engine.book_seat(conn, break_id, user_id, username, booking_date)
+    finally:
+        conn.close()
+
+def auto_schedule_breaks(booking_date, preferences=None):
+    """Seat every unbooked agent for ``booking_date``; returns (assignments, unassigned) or None while locked."""
+    if is_killswitch_enabled():
+        st.error("System is currently locked. Please contact the developer.")
+        return None
+        
+    conn = get_db_connection()
+    try:
+        return break_engine.auto_schedule(conn, booking_date, preferences)
+    finally:
+        conn.close()
+
+def parse_break_preferences(frame):
+    """Map user_id -> [break_id, ...] from a CSV with username and break_name columns.
+
+    Rows for the same agent are taken in file order, first row = first choice;
+    unknown agents or break names are skipped and returned for reporting.
+    """
+    user_ids = {username.lower(): user_id for user_id, username in get_mention_directory()}
+    break_ids = {b[1].lower(): b[0] for b in get_all_break_slots()}
+    preferences, skipped = {}, []
+    for username, break_name in zip(frame["username"].astype(str), frame["break_name"].astype(str)):
+        user_id = user_ids.get(username.strip().lower())
+        break_id = break_ids.get(break_name.strip().lower())
+        if user_id is None or break_id is None:
+            skipped.append(f"{username} → {break_name}")
+            continue
+        preferences.setdefault(user_id, []).append(break_id)
+    return preferences, skipped
+
+def cancel_break_booking(break_id, user_id, booking_date):
+    """Release a booked seat; returns a break_engine status, or None while locked."""
+    if is_killswitch_enabled():
+        st.error("System is currently locked. Please contact the developer.")
+        return None
+        
+    conn = get_db_connection()
+    try:
+        return break_engine.cancel_seat(conn, break_id, user_id, booking_date)
     finally:
         conn.close()
 
@@ -687,6 +897,28 @@ def get_all_bookings(date):
     finally:
         conn.close()
 
+def get_bookings_version(date):
+    """Changes whenever a booking for ``date`` is added or removed (an index-only read)."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*), IFNULL(MAX(id), 0) FROM break_bookings
+            WHERE booking_date = ?
+        """, (date,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+def get_break_slot_index(slots=None):
+    """IntervalIndex over every slot (or ``slots`` rows); payloads are (id, break_name, max_users)."""
+    return break_engine.IntervalIndex.from_slots(
+        (b[2], b[3], (b[0], b[1], b[4])) for b in (get_all_break_slots() if slots is None else slots))
+
+def format_minute(minute):
+    minute %= break_engine.MINUTES_PER_DAY
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
 def delete_break_slot(break_id):
     if is_killswitch_enabled():
         st.error("System is currently locked. Please contact the developer.")
@@ -725,20 +957,37 @@ def add_late_login(agent_name, presence_time, login_time, reason):
     try:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO late_logins (agent_name, presence_time, login_time, reason, timestamp) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (agent_name, presence_time, login_time, reason,
-             datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            INSERT INTO late_logins (agent_name, presence_time, login_time, reason, timestamp, created_at,
+                                     presence_minute, login_minute) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (agent_name, presence_time, login_time, reason, *now_stamps(),
+             db.minute_of_day(presence_time), db.minute_of_day(login_time)))
         conn.commit()
         return True
     finally:
         conn.close()
 
-def get_late_logins():
+def get_late_logins(agent_name=None, created_range=ALL_TIME):
+    """Late logins in ``created_range``, optionally one agent's; the last column is minutes late."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM late_logins ORDER BY timestamp DESC")
+        if agent_name is None:
+            cursor.execute("""
+                SELECT id, agent_name, presence_time, login_time, reason, timestamp,
+                       (login_minute - presence_minute + 1440) % 1440
+                FROM late_logins
+                WHERE created_at >= ? AND created_at < ?
+                ORDER BY created_at DESC, id DESC
+            """, created_range)
+        else:
+            cursor.execute("""
+                SELECT id, agent_name, presence_time, login_time, reason, timestamp,
+                       (login_minute - presence_minute + 1440) % 1440
+                FROM late_logins
+                WHERE agent_name = ? AND created_at >= ? AND created_at < ?
+                ORDER BY created_at DESC, id DESC
+            """, (agent_name, *created_range))
         return cursor.fetchall()
     finally:
         conn.close()
@@ -752,20 +1001,35 @@ def add_quality_issue(agent_name, issue_type, timing, mobile_number, product):
     try:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO quality_issues (agent_name, issue_type, timing, mobile_number, product, timestamp) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (agent_name, issue_type, timing, mobile_number, product,
-             datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            INSERT INTO quality_issues (agent_name, issue_type, timing, mobile_number, product, timestamp,
+                                        created_at, timing_minute) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (agent_name, issue_type, timing, mobile_number, product, *now_stamps(),
+             db.minute_of_day(timing)))
         conn.commit()
         return True
     finally:
         conn.close()
 
-def get_quality_issues():
+def get_quality_issues(agent_name=None, created_range=ALL_TIME):
+    """Quality issues in ``created_range``, optionally one agent's."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM quality_issues ORDER BY timestamp DESC")
+        if agent_name is None:
+            cursor.execute("""
+                SELECT id, agent_name, issue_type, timing, mobile_number, product, timestamp
+                FROM quality_issues
+                WHERE created_at >= ? AND created_at < ?
+                ORDER BY created_at DESC, id DESC
+            """, created_range)
+        else:
+            cursor.execute("""
+                SELECT id, agent_name, issue_type, timing, mobile_number, product, timestamp
+                FROM quality_issues
+                WHERE agent_name = ? AND created_at >= ? AND created_at < ?
+                ORDER BY created_at DESC, id DESC
+            """, (agent_name, *created_range))
         return cursor.fetchall()
     finally:
         conn.close()
@@ -779,20 +1043,37 @@ def add_midshift_issue(agent_name, issue_type, start_time, end_time):
     try:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO midshift_issues (agent_name, issue_type, start_time, end_time, timestamp) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (agent_name, issue_type, start_time, end_time,
-             datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            INSERT INTO midshift_issues (agent_name, issue_type, start_time, end_time, timestamp, created_at,
+                                         start_minute, end_minute) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (agent_name, issue_type, start_time, end_time, *now_stamps(),
+             db.minute_of_day(start_time), db.minute_of_day(end_time)))
         conn.commit()
         return True
     finally:
         conn.close()
 
-def get_midshift_issues():
+def get_midshift_issues(agent_name=None, created_range=ALL_TIME):
+    """Mid-shift issues in ``created_range``, optionally one agent's; the last column is the duration in minutes."""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM midshift_issues ORDER BY timestamp DESC")
+        if agent_name is None:
+            cursor.execute("""
+                SELECT id, agent_name, issue_type, start_time, end_time, timestamp,
+                       (end_minute - start_minute + 1440) % 1440
+                FROM midshift_issues
+                WHERE created_at >= ? AND created_at < ?
+                ORDER BY created_at DESC, id DESC
+            """, created_range)
+        else:
+            cursor.execute("""
+                SELECT id, agent_name, issue_type, start_time, end_time, timestamp,
+                       (end_minute - start_minute + 1440) % 1440
+                FROM midshift_issues
+                WHERE agent_name = ? AND created_at >= ? AND created_at < ?
+                ORDER BY created_at DESC, id DESC
+            """, (agent_name, *created_range))
         return cursor.fetchall()
     finally:
         conn.close()
@@ -839,143 +1120,6 @@ def clear_midshift_issues():
     finally:
         conn.close()
 
-# --------------------------
-# Fancy Number Checker Functions
-# --------------------------
-
-def is_sequential(digits, step=1):
-    """Check if digits form a sequential pattern with given step"""
-    try:
-        return all(int(digits[i]) == int(digits[i-1]) + step for i in range(1, len(digits)))
-    except:
-        return False
-
-def is_fancy_number(phone_number):
-    clean_number = re.sub(r'\D', '', phone_number)
-    
-    # Get last 6 digits according to Lycamobile policy
-    if len(clean_number) >= 6:
-        last_six = clean_number[-6:]
-        last_three = clean_number[-3:]
-    else:
-        return False, "Number too short (need at least 6 digits)"
-    
-    patterns = []
-    
-    # Special case for 13322866688
-    if clean_number == "13322866688":
-        patterns.append("Special VIP number (13322866688)")
-    
-    # Check for ABBBAA pattern (like 566655)
-    if (len(last_six) == 6 and 
-        last_six[0] == last_six[5] and 
-        last_six[1] == last_six[2] == last_six[3] and 
-        last_six[4] == last_six[0] and 
-        last_six[0] != last_six[1]):
-        patterns.append("ABBBAA pattern (e.g., 566655)")
-    
-    # Check for ABBBA pattern (like 233322)
-    if (len(last_six) >= 5 and 
-        last_six[0] == last_six[4] and 
-        last_six[1] == last_six[2] == last_six[3] and 
-        last_six[0] != last_six[1]):
-        patterns.append("ABBBA pattern (e.g., 233322)")
-    
-    # 1. 6-digit patterns (strict matches only)
-    # All same digits (666666)
-    if len(set(last_six)) == 1:
-        patterns.append("6 identical digits")
-        
-    # Consecutive ascending (123456)
-    if is_sequential(last_six, 1):
-        patterns.append("6-digit ascending sequence")
-        
-    # Consecutive descending (654321)
-    if is_sequential(last_six, -1):
-        patterns.append("6-digit descending sequence")
-        
-    # Palindrome (100001)
-    if last_six == last_six[::-1]:
-        patterns.append("6-digit palindrome")
-    
-    # 2. 3-digit patterns (strict matches from image)
-    first_triple = last_six[:3]
-    second_triple = last_six[3:]
-    
-    # Double triplets (444555)
-    if len(set(first_triple)) == 1 and len(set(second_triple)) == 1 and first_triple != second_triple:
-        patterns.append("Double triplets (444555)")
-    
-    # Similar triplets (121122)
-    if (first_triple[0] == first_triple[1] and 
-        second_triple[0] == second_triple[1] and 
-        first_triple[2] == second_triple[2]):
-        patterns.append("Similar triplets (121122)")
-    
-    # Repeating triplets (786786)
-    if first_triple == second_triple:
-        patterns.append("Repeating triplets (786786)")
-    
-    # Nearly sequential (457456) - exactly 1 digit difference
-    if abs(int(first_triple) - int(second_triple)) == 1:
-        patterns.append("Nearly sequential triplets (457456)")
-    
-    # 3. 2-digit patterns (strict matches from image)
-    # Incremental pairs (111213)
-    pairs = [last_six[i:i+2] for i in range(0, 5, 1)]
-    try:
-        if all(int(pairs[i]) == int(pairs[i-1]) + 1 for i in range(1, len(pairs))):
-            patterns.append("Incremental pairs (111213)")
-    
-        # Repeating pairs (202020)
-        if (pairs[0] == pairs[2] == pairs[4] and 
-            pairs[1] == pairs[3] and 
-            pairs[0] != pairs[1]):
-            patterns.append("Repeating pairs (202020)")
-    
-        # Alternating pairs (010101)
-        if (pairs[0] == pairs[2] == pairs[4] and 
-            pairs[1] == pairs[3] and 
-            pairs[0] != pairs[1]):
-            patterns.append("Alternating pairs (010101)")
-    
-        # Stepping pairs (324252) - Fixed this check
-        if (all(int(pairs[i][0]) == int(pairs[i-1][0]) + 1 for i in range(1, len(pairs))) and
-            all(int(pairs[i][1]) == int(pairs[i-1][1]) + 2 for i in range(1, len(pairs)))):
-            patterns.append("Stepping pairs (324252)")
-    except:
-        pass
-    
-    # 4. Exceptional cases (must match exactly)
-    exceptional_triplets = ['123', '555', '777', '999']
-    if last_three in exceptional_triplets:
-        patterns.append(f"Exceptional case ({last_three})")
-    
-    # Strict validation - only allow patterns that exactly match our rules
-    valid_patterns = []
-    for p in patterns:
-        if any(rule in p for rule in [
-            "Special VIP number",
-            "ABBBAA pattern",
-            "ABBBA pattern",
-            "6 identical digits",
-            "6-digit ascending sequence",
-            "6-digit descending sequence",
-            "6-digit palindrome",
-            "Double triplets (444555)",
-            "Similar triplets (121122)",
-            "Repeating triplets (786786)",
-            "Nearly sequential triplets (457456)",
-            "Incremental pairs (111213)",
-            "Repeating pairs (202020)",
-            "Alternating pairs (010101)",
-            "Stepping pairs (324252)",
-            "Exceptional case"
-        ]):
-            valid_patterns.append(p)
-    
-    return bool(valid_patterns), ", ".join(valid_patterns) if valid_patterns else "No qualifying fancy pattern"
-
 # --------------------------
 # Streamlit App
 # --------------------------
@@ -1048,10 +1192,12 @@ if "authenticated" not in st.session_state:
         "authenticated": False,
         "role": None,
         "username": None,
+        "user_id": None,
         "current_section": "requests",
-        "last_request_count": 0,
-        "last_mistake_count": 0,
-        "last_message_ids": [],
+        "last_request_id": 0,
+        "last_mistake_id": 0,
+        "last_message_id": 0,
+        "last_read_message_id": 0,
         "break_edits": {}
     })
 
@@ -1066,15 +1212,19 @@ if not st.session_state.authenticated:
             password = st.text_input("Password", type="password")
             if st.form_submit_button("Login"):
                 if username and password:
-                    role = authenticate(username, password)
-                    if role:
+                    user = authenticate(username, password)
+                    if user:
+                        user_id, username, role = user
+                        counters = get_activity_counters(username, user_id)
                         st.session_state.update({
                             "authenticated": True,
                             "role": role,
                             "username": username,
-                            "last_request_count": len(get_requests()),
-                            "last_mistake_count": len(get_mistakes()),
-                            "last_message_ids": [msg[0] for msg in get_group_messages()]
+                            "user_id": user_id,
+                            "last_request_id": counters["max_request_id"],
+                            "last_mistake_id": counters["max_mistake_id"],
+                            "last_message_id": counters["max_message_id"],
+                            "last_read_message_id": counters["max_message_id"]
                         })
                         st.rerun()
                     else:
@@ -1096,33 +1246,44 @@ else:
         </div>
         """, unsafe_allow_html=True)
 
+    # Chat retention runs for signed-in sessions only, and never while the system or chat is locked
+    if not is_killswitch_enabled() and not is_chat_killswitch_enabled():
+        run_daily_chat_archive()
+
     def show_notifications():
-        current_requests = get_requests()
-        current_mistakes = get_mistakes()
-        current_messages = get_group_messages()
-        
-        new_requests = len(current_requests) - st.session_state.last_request_count
-        if new_requests > 0 and st.session_state.last_request_count > 0:
-            st.toast(f"📋 {new_requests} new request(s) submitted!")
-        st.session_state.last_request_count = len(current_requests)
-        
-        new_mistakes = len(current_mistakes) - st.session_state.last_mistake_count
-        if new_mistakes > 0 and st.session_state.last_mistake_count > 0:
-            st.toast(f"❌ {new_mistakes} new mistake(s) reported!")
-        st.session_state.last_mistake_count = len(current_mistakes)
-        
-        current_message_ids = [msg[0] for msg in current_messages]
-        new_messages = [msg for msg in current_messages if msg[0] not in st.session_state.last_message_ids]
-        for msg in new_messages:
-            if msg[1] != st.session_state.username:
-                mentions = msg[4].split(',') if msg[4] else []
-                if st.session_state.username in mentions:
-                    st.toast(f"💬 You were mentioned by {msg[1]}!")
-                else:
-                    st.toast(f"💬 New message from {msg[1]}!")
-        st.session_state.last_message_ids = current_message_ids
+        """Toast what arrived since the last rerun and return the sidebar counters."""
+        counters = get_activity_counters(
+            st.session_state.username,
+            st.session_state.user_id,
+            st.session_state.last_request_id,
+            st.session_state.last_mistake_id,
+            st.session_state.last_read_message_id
+        )
+        
+        if counters["new_requests"] > 0:
+            st.toast(f"📋 {counters['new_requests']} new request(s) submitted!")
+        st.session_state.last_request_id = counters["max_request_id"]
+        
+        if counters["new_mistakes"] > 0:
+            st.toast(f"❌ {counters['new_mistakes']} new mistake(s) reported!")
+        st.session_state.last_mistake_id = counters["max_mistake_id"]
+        
+        if counters["max_message_id"] > st.session_state.last_message_id:
+            for msg in get_new_group_messages(st.session_state.last_message_id, st.session_state.user_id):
+                if msg[1] != st.session_state.username:
+                    if msg[5]:
+                        st.toast(f"💬 You were mentioned by {msg[1]}!")
+                    else:
+                        st.toast(f"💬 New message from {msg[1]}!")
+        st.session_state.last_message_id = counters["max_message_id"]
+        # Everything up to the newest message counts as read while chat is open
+        if st.session_state.current_section == "chat":
+            st.session_state.last_read_message_id = counters["max_message_id"]
+            counters["unread_messages"] = 0
+            counters["unread_mentions"] = 0
+        return counters
 
-    show_notifications()
+    counters = show_notifications()
 
     with st.sidebar:
         st.title(f"👋 Welcome, {st.session_state.username}")
@@ -1148,18 +1309,13 @@ else:
                 st.session_state.current_section = value
                 
         st.markdown("---")
-        pending_requests = len([r for r in get_requests() if not r[6]])
-        new_mistakes = len(get_mistakes())
-        unread_messages = len([m for m in get_group_messages() 
-                             if m[0] not in st.session_state.last_message_ids 
-                             and m[1] != st.session_state.username])
-        
         st.markdown(f"""
         <div style="margin-bottom: 20px;">
             <h4>🔔 Notifications</h4>
-            <p>📋 Pending requests: {pending_requests}</p>
-            <p>❌ Recent mistakes: {new_mistakes}</p>
-            <p>💬 Unread messages: {unread_messages}</p>
+            <p>📋 Pending requests: {counters["pending_requests"]}</p>
+            <p>❌ Recent mistakes: {counters["recent_mistakes"]}</p>
+            <p>💬 Unread messages: {counters["unread_messages"]}</p>
+            <p>📣 Unread mentions: {counters["unread_mentions"]}</p>
         </div>
         """, unsafe_allow_html=True)
         
@@ -1169,6 +1325,11 @@ else:
 
     st.title(st.session_state.current_section.title())
 
+    # The chat buffer is rebuilt from the database each time the chat is opened
+    if st.session_state.current_section != "chat":
+        st.session_state.pop("chat_buffer", None)
+        st.session_state.pop("chat_history_start", None)
+
     if st.session_state.current_section == "requests":
         if not is_killswitch_enabled():
             with st.expander("➕ Submit New Request"):
@@ -1185,11 +1346,36 @@ else:
         
         st.subheader("🔍 Search Requests")
         search_query = st.text_input("Search requests...")
-        requests = search_requests(search_query) if search_query else get_requests()
         
         st.subheader("All Requests")
+        if search_query:
+            requests = search_requests(search_query)
+        else:
+            filter_cols = st.columns([2, 2, 1])
+            status_filter = filter_cols[0].radio("Status", ["All", "Pending", "Completed"],
+                                                 horizontal=True, key="requests_status_filter")
+            with filter_cols[1]:
+                created_range = date_range_filter("requests_date_range")
+            page_size = filter_cols[2].selectbox("Per page", REQUESTS_PAGE_SIZE_OPTIONS,
+                                                 index=REQUESTS_PAGE_SIZE_OPTIONS.index(REQUESTS_PAGE_SIZE),
+                                                 key="requests_page_size")
+            # Positions of the pages visited so far; reset whenever the filter changes
+            if st.session_state.get("requests_page_filter") != (status_filter, created_range, page_size):
+                st.session_state.requests_page_filter = (status_filter, created_range, page_size)
+                st.session_state.requests_page_positions = [None]
+            page_positions = st.session_state.requests_page_positions
+            completed_filter = {"All": None, "Pending": False, "Completed": True}[status_filter]
+            requests, next_position = get_requests_page(completed_filter, page_positions[-1], page_size,
+                                                        created_range)
+            if not requests:
+                st.info("No requests found")
+        # Threads load only for cards whose "Show updates" toggle is on, in one query
+        threads = get_comments_for_requests(
+            [req[0] for req in requests if st.session_state.get(f"thread_{req[0]}")])
         for req in requests:
-            req_id, agent, req_type, identifier, comment, timestamp, completed = req
+            (req_id, agent, req_type, identifier, comment, timestamp, completed,
+             comment_count, last_comment_at) = req[:9]
+            snippet_html = f"<p><small>Match: {req[9]}</small></p>" if len(req) > 9 else ""
             with st.container():
                 cols = st.columns([0.1, 0.9])
                 with cols[0]:
@@ -1208,13 +1394,14 @@ else:
                             <small>{timestamp}</small>
                         </div>
                         <p>Agent: {agent}</p>
-                        <p>Identifier: {identifier}</p>
+                        <p>Identifier: {identifier}</p>{snippet_html}
                         <div style="margin-top: 1rem;">
-                            <h5>Status Updates:</h5>
+                            <h5>Status Updates ({comment_count}):</h5>
+                            <small>{f"Last update: {last_comment_at}" if last_comment_at else "No updates yet"}</small>
                     """, unsafe_allow_html=True)
                     
-                    comments = get_request_comments(req_id)
-                    for comment in comments:
+                    st.toggle("Show updates", key=f"thread_{req_id}", disabled=not comment_count)
+                    for comment in threads.get(req_id, []):
                         cmt_id, _, user, cmt_text, cmt_time = comment
                         st.markdown(f"""
                             <div class="comment-box">
@@ -1236,34 +1423,45 @@ else:
                                     add_request_comment(req_id, st.session_state.username, new_comment)
                                     st.rerun()
 
+        if not search_query:
+            nav_cols = st.columns([1, 1, 4])
+            if len(page_positions) > 1:
+                nav_cols[0].button("⬅️ Newer", key="requests_prev_page", on_click=page_positions.pop)
+            if next_position:
+                nav_cols[1].button("Older ➡️", key="requests_next_page",
+                                   on_click=page_positions.append, args=(next_position,))
+            nav_cols[2].caption(f"Page {len(page_positions)}")
+
     elif st.session_state.current_section == "dashboard":
         st.subheader("📊 Request Completion Dashboard")
-        all_requests = get_requests()
-        total = len(all_requests)
-        completed = sum(1 for r in all_requests if r[6])
-        rate = (completed/total*100) if total > 0 else 0
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Requests", total)
-        with col2:
-            st.metric("Completed", completed)
-        with col3:
-            st.metric("Completion Rate", f"{rate:.1f}%")
-        
-        df = pd.DataFrame({
-            'Date': [datetime.strptime(r[5], "%Y-%m-%d %H:%M:%S").date() for r in all_requests],
-            'Status': ['Completed' if r[6] else 'Pending' for r in all_requests],
-            'Type': [r[2] for r in all_requests]
-        })
-        
-        st.subheader("Request Trends")
-        st.bar_chart(df['Date'].value_counts())
-        
-        st.subheader("Request Type Distribution")
-        type_counts = df['Type'].value_counts().reset_index()
-        type_counts.columns = ['Type', 'Count']
-        st.bar_chart(type_counts.set_index('Type'))
+        first_day, last_day = get_request_day_range()
+        if first_day is None:
+            st.info("No requests yet")
+        else:
+            first_date = datetime.strptime(first_day, "%Y-%m-%d").date()
+            last_date = max(datetime.strptime(last_day, "%Y-%m-%d").date(), datetime.now().date())
+            date_range = st.date_input("Date range", (first_date, last_date),
+                                       min_value=first_date, max_value=last_date)
+            # The picker returns a single date while the second one is being chosen
+            start_date, end_date = date_range if len(date_range) == 2 else (date_range[0], date_range[0])
+            metrics = get_dashboard_metrics(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"),
+                                            get_data_version("requests"))
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Requests", metrics["total"])
+            with col2:
+                st.metric("Completed", metrics["completed"])
+            with col3:
+                st.metric("Completion Rate", f"{metrics['rate']:.1f}%")
+            
+            st.subheader("Request Trends")
+            trend = pd.DataFrame(metrics["per_day"], columns=["Date", "Total", "Completed"]).set_index("Date")
+            trend["Pending"] = trend["Total"] - trend["Completed"]
+            st.bar_chart(trend[["Completed", "Pending"]])
+            
+            st.subheader("Request Type Distribution")
+            st.bar_chart(pd.DataFrame(metrics["per_type"], columns=["Type", "Count"]).set_index("Type"))
 
     elif st.session_state.current_section == "breaks":
         today = datetime.now().strftime("%Y-%m-%d")
@@ -1273,32 +1471,88 @@ else:
         if st.session_state.role == "admin":
             st.subheader("Admin: Break Schedule Management")
             
+            # Set before the rerun that follows adding a slot
+            overlap_notice = st.session_state.pop("break_overlap_notice", None)
+            if overlap_notice:
+                st.warning(overlap_notice)
+            
+            with st.expander("⚙️ Break Settings"):
+                with st.form("break_settings_form"):
+                    limit = st.number_input("Max agents on break at once (0 = no limit)", min_value=0,
+                                            value=get_max_agents_on_break() or 0)
+                    if st.form_submit_button("Save Settings"):
+                        set_max_agents_on_break(int(limit))
+                        st.rerun()
+            
             with st.expander("➕ Add New Break Slot"):
+                load_limit = get_max_agents_on_break()
                 with st.form("add_break_form"):
                     cols = st.columns(3)
                     break_name = cols[0].text_input("Break Name")
                     start_time = cols[1].text_input("Start Time (HH:MM)")
                     end_time = cols[2].text_input("End Time (HH:MM)")
                     max_users = st.number_input("Max Users", min_value=1, value=1)
+                    exceed_limit = load_limit and st.checkbox(
+                        f"Add even if more than {load_limit} agents would be on break at once")
                     
                     if st.form_submit_button("Add Break Slot"):
                         if break_name:
                             try:
                                 # Validate time formats
-                                datetime.strptime(start_time, "%H:%M")
-                                datetime.strptime(end_time, "%H:%M")
-                                add_break_slot(
+                                start_minute, end_minute = break_engine.slot_interval(start_time, end_time)
+                                slot_index = get_break_slot_index()
+                                clashes = slot_index.overlapping_daily(start_minute, end_minute)
+                                peak = break_engine.peak_load(slot_index, start_minute, end_minute,
+                                                              extra=max_users, weight=lambda slot: slot[2])
+                                if load_limit and peak > load_limit and not exceed_limit:
+                                    st.warning(f"Up to {peak} agents would be on break at once "
+                                               f"(limit {load_limit}). Tick the box to add it anyway.")
+                                elif add_break_slot(
                                     break_name,
                                     start_time,
                                     end_time,
                                     max_users,
                                     st.session_state.username
-                                )
-                                st.success("Break slot added successfully!")
-                                st.rerun()
+                                ):
+                                    # Overlapping slots are allowed; just make sure it was intended
+                                    if clashes:
+                                        st.session_state.break_overlap_notice = (
+                                            f"{break_name} was added, but it overlaps " + ", ".join(
+                                                f"{name} ({format_minute(lo)} - {format_minute(hi)})"
+                                                for lo, hi, (_, name, _) in clashes) + ".")
+                                    st.success("Break slot added successfully!")
+                                    st.rerun()
                             except ValueError:
                                 st.error("Invalid time format. Please use HH:MM format (e.g., 08:30)")
             
+            with st.expander("🤖 Auto-Schedule Breaks"):
+                st.caption("Gives every agent without a break on the selected date a seat, "
+                           "spreading agents evenly over the slots.")
+                with st.form("auto_schedule_form"):
+                    preferences_file = st.file_uploader(
+                        "Preferences (optional CSV with username and break_name columns, first choice first)",
+                        type=["csv"])
+                    if st.form_submit_button("Run Auto-Scheduler"):
+                        try:
+                            preferences, skipped = {}, []
+                            if preferences_file is not None:
+                                preferences, skipped = parse_break_preferences(pd.read_csv(preferences_file))
+                            started = datetime.now()
+                            result = auto_schedule_breaks(formatted_date, preferences)
+                            elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+                            if result is not None:
+                                assignments, unassigned = result
+                                st.success(f"Scheduled {len(assignments)} agents in {elapsed_ms:.0f} ms")
+                                if unassigned:
+                                    st.warning(f"No free seat left for {len(unassigned)} agents: "
+                                               + ", ".join(username for _, username in unassigned))
+                                if skipped:
+                                    st.warning("Ignored unknown preferences: " + ", ".join(skipped))
+                        except KeyError:
+                            st.error("The preferences CSV needs username and break_name columns")
+                        except Exception as e:
+                            st.error(f"Error scheduling breaks: {str(e)}")
+            
             st.subheader("Current Break Schedule")
             breaks = get_all_break_slots()
             
@@ -1382,6 +1636,56 @@ else:
                     st.success("All changes saved successfully!")
                     st.rerun()
             
+            st.markdown("---")
+            st.subheader("📡 Live Break Board")
+            
+            @st.fragment(run_every=BREAK_BOARD_REFRESH_SECONDS)
+            def break_board(date):
+                """Rebuilds the interval index only when the date's bookings or the slot times change."""
+                # Slots are a handful of rows and admins edit them in place, so always re-read
+                slots = get_all_break_slots()
+                # Booked intervals take their times from the slots, so a slot edit invalidates them too
+                key = (date, get_bookings_version(date), tuple((b[0], b[2], b[3]) for b in slots))
+                board = st.session_state.get("break_board")
+                if board is None or board["key"] != key:
+                    bookings = get_all_bookings(date)
+                    agents = break_engine.IntervalIndex.from_slots((b[7], b[8], b[3]) for b in bookings)
+                    board = {"key": key, "agents": agents, "on_break": break_engine.coverage(agents)}
+                    st.session_state.break_board = board
+                agents = board["agents"]
+                seats = break_engine.coverage(get_break_slot_index(slots), weight=lambda slot: slot[2])
+                
+                if date == datetime.now().strftime("%Y-%m-%d"):
+                    now = datetime.now()
+                    minute = now.hour * 60 + now.minute
+                    on_break = agents.at(minute)
+                    upcoming = [interval for interval in agents.overlapping_daily(
+                                    minute + 1, minute + 1 + BREAK_BOARD_LOOKAHEAD_MINUTES)
+                                if interval not in on_break]
+                    cols = st.columns(2)
+                    with cols[0]:
+                        st.metric("On break now", len(on_break))
+                        for lo, hi, username in on_break:
+                            st.write(f"{username} (until {format_minute(hi)})")
+                    with cols[1]:
+                        st.metric(f"Starting in the next {BREAK_BOARD_LOOKAHEAD_MINUTES} min", len(upcoming))
+                        for lo, hi, username in upcoming:
+                            st.write(f"{username} (at {format_minute(lo)})")
+                
+                if len(agents):
+                    minutes = [minute for minute in range(break_engine.MINUTES_PER_DAY)
+                               if seats[minute] or board["on_break"][minute]]
+                    window = range(max(minutes[0] - 30, 0), min(minutes[-1] + 31, break_engine.MINUTES_PER_DAY))
+                    st.caption("Floor coverage: agents on break per minute vs. seats scheduled")
+                    st.area_chart(pd.DataFrame({
+                        "On break": [board["on_break"][minute] for minute in window],
+                        "Seats": [seats[minute] for minute in window],
+                    }, index=[format_minute(minute) for minute in window]))
+                else:
+                    st.info("No bookings for selected date")
+            
+            break_board(formatted_date)
+            
             st.markdown("---")
             st.subheader("All Bookings for Selected Date")
             try:
@@ -1402,46 +1706,36 @@ else:
         else:
             st.subheader("Available Break Slots")
             try:
-                available_breaks = get_available_break_slots(formatted_date)
+                slots = get_break_slot_availability(formatted_date, st.session_state.user_id)
                 
-                if available_breaks:
-                    for b in available_breaks:
-                        b_id, name, start, end, max_u, curr_u, created_by, ts = b
-                        
-                        try:
-                            conn = get_db_connection()
-                            cursor = conn.cursor()
-                            cursor.execute("""
-                                SELECT COUNT(*) 
-                                FROM break_bookings 
-                                WHERE break_id = ? AND booking_date = ?
-                            """, (b_id, formatted_date))
-                            booked_count = cursor.fetchone()[0]
-                            remaining = max_u - booked_count
-                        except Exception as e:
-                            st.error(f"Error checking availability: {str(e)}")
-                            continue
-                        finally:
-                            conn.close()
-                        
+                if slots:
+                    for b_id, name, start, end, max_u, remaining, booked_by_me in slots:
                         with st.container():
                             cols = st.columns([3, 2, 1])
                             cols[0].write(f"*{name}* ({start} - {end})")
-                            cols[1].write(f"Available slots: {remaining}/{max_u}")
+                            cols[1].write(f"Available slots: {max(remaining, 0)}/{max_u}")
                             
-                            if cols[2].button("Book", key=f"book_{b_id}"):
+                            if booked_by_me:
+                                cols[2].write("✅ Booked")
+                            elif remaining <= 0:
+                                cols[2].write("Full")
+                            elif cols[2].button("Book", key=f"book_{b_id}"):
                                 try:
-                                    conn = get_db_connection()
-                                    cursor = conn.cursor()
-                                    cursor.execute("SELECT id FROM users WHERE username = ?", 
-                                                (st.session_state.username,))
-                                    user_id = cursor.fetchone()[0]
-                                    book_break_slot(b_id, user_id, st.session_state.username, formatted_date)
-                                    st.rerun()
+                                    status = book_break_slot(b_id, st.session_state.user_id,
+                                                             st.session_state.username, formatted_date)
+                                    if status == break_engine.BOOKED:
+                                        st.toast(f"✅ Booked {name} ({start} - {end})")
+                                        st.rerun()
+                                    elif status == break_engine.FULL:
+                                        st.warning(f"{name} is full for this date. Please pick another slot.")
+                                    elif status == break_engine.ALREADY_BOOKED:
+                                        st.info(f"You already booked {name} for this date.")
+                                    elif status == break_engine.NO_SUCH_SLOT:
+                                        st.error("This break slot no longer exists.")
                                 except Exception as e:
                                     st.error(f"Error booking slot: {str(e)}")
-                                finally:
-                                    conn.close()
+                else:
+                    st.info("No break slots have been scheduled")
             except Exception as e:
                 st.error(f"Error loading break slots: {str(e)}")
             
@@ -1453,7 +1747,12 @@ else:
                 if user_bookings:
                     for b in user_bookings:
                         b_id, break_id, user_id, username, date, ts, break_name, start, end = b
-                        st.write(f"{break_name} ({start} - {end})")
+                        cols = st.columns([5, 1])
+                        cols[0].write(f"{break_name} ({start} - {end})")
+                        if cols[1].button("Cancel", key=f"cancel_booking_{b_id}"):
+                            if cancel_break_booking(break_id, user_id, date) == break_engine.CANCELLED:
+                                st.toast(f"Cancelled {break_name} ({start} - {end})")
+                                st.rerun()
                 else:
                     st.info("You have no bookings for selected date")
             except Exception as e:
@@ -1473,11 +1772,15 @@ else:
         
         st.subheader("🔍 Search Mistakes")
         search_query = st.text_input("Search mistakes...")
-        mistakes = search_mistakes(search_query) if search_query else get_mistakes()
+        if search_query:
+            mistakes = search_mistakes(search_query)
+        else:
+            mistakes = get_mistakes(date_range_filter("mistakes_date_range"))
         
         st.subheader("Mistakes Log")
         for mistake in mistakes:
-            m_id, tl, agent, ticket, error, ts = mistake
+            m_id, tl, agent, ticket, error, ts = mistake[:6]
+            snippet_html = f"<p><small>Match: {mistake[6]}</small></p>" if len(mistake) > 6 else ""
             st.markdown(f"""
             <div class="card">
                 <div style="display: flex; justify-content: space-between;">
@@ -1486,18 +1789,42 @@ else:
                 </div>
                 <p>Agent: {agent}</p>
                 <p>Ticket: {ticket}</p>
-                <p>Error: {error}</p>
+                <p>Error: {error}</p>{snippet_html}
             </div>
             """, unsafe_allow_html=True)
 
     elif st.session_state.current_section == "chat":
-        if is_chat_killswitch_enabled():
-            st.warning("Chat functionality is currently disabled by the administrator.")
-        else:
-            messages = get_group_messages()
-            for msg in reversed(messages):
-                msg_id, sender, message, ts, mentions = msg
-                is_mentioned = st.session_state.username in (mentions.split(',') if mentions else [])
+        @st.fragment(run_every=CHAT_REFRESH_SECONDS)
+        def chat_feed():
+            """Reruns on its own every few seconds, fetching only messages above the last seen id."""
+            if is_chat_killswitch_enabled():
+                st.warning("Chat functionality is currently disabled by the administrator.")
+                return
+            
+            user_id = st.session_state.user_id
+            buffer = st.session_state.get("chat_buffer")
+            if buffer is None:
+                buffer = deque(reversed(get_group_messages(user_id)), maxlen=CHAT_BUFFER_SIZE)
+                st.session_state.chat_buffer = buffer
+                mentioned = True  # opening the chat clears every pending mention
+            else:
+                new_messages = get_new_group_messages(buffer[-1][0] if buffer else 0, user_id, CHAT_BUFFER_SIZE)
+                buffer.extend(new_messages)
+                mentioned = any(msg[5] for msg in new_messages)
+            if buffer:
+                # Seen here, so no toast for them and they count as read
+                st.session_state.last_message_id = max(st.session_state.last_message_id, buffer[-1][0])
+                st.session_state.last_read_message_id = st.session_state.last_message_id
+                if mentioned:
+                    mark_mentions_seen(user_id, buffer[-1][0])
+            
+            if st.session_state.get("chat_history_start"):
+                st.caption("Start of chat history")
+            else:
+                st.button("⬆️ Load older messages", on_click=load_older_messages)
+            
+            for msg in buffer:
+                msg_id, sender, message, ts, mentions, is_mentioned = msg
                 st.markdown(f"""
                 <div style="background-color: {'#3b82f6' if is_mentioned else '#1F1F1F'};
                             padding: 1rem;
@@ -1509,24 +1836,46 @@ else:
                 """, unsafe_allow_html=True)
             
             if not is_killswitch_enabled():
-                with st.form("chat_form"):
-                    message = st.text_input("Type your message...")
-                    if st.form_submit_button("Send"):
-                        if message:
-                            send_group_message(st.session_state.username, message)
-                            st.rerun()
+                with st.form("chat_form", clear_on_submit=True):
+                    st.text_input("Type your message...", key="chat_message")
+                    st.form_submit_button("Send", on_click=send_chat_message)
+
+        def load_older_messages():
+            # Keyset on the oldest id shown; the buffer grows to hold the extra page
+            buffer = st.session_state.chat_buffer
+            older = get_older_group_messages(buffer[0][0] if buffer else LATEST_MESSAGE_ID,
+                                             st.session_state.user_id, st.session_state.username)
+            if len(older) < CHAT_PAGE_SIZE:
+                st.session_state.chat_history_start = True
+            if older:
+                st.session_state.chat_buffer = deque(list(reversed(older)) + list(buffer),
+                                                     maxlen=buffer.maxlen + len(older))
+
+        def send_chat_message():
+            # Runs before the fragment reruns, so the new message shows up in that same run
+            if st.session_state.chat_message:
+                send_group_message(st.session_state.username, st.session_state.chat_message)
+
+        chat_feed()
 
     elif st.session_state.current_section == "hold":
         if st.session_state.role == "admin" and not is_killswitch_enabled():
             with st.expander("📤 Upload Image"):
                 img = st.file_uploader("Choose image", type=["jpg", "png", "jpeg"])
-                if img:
-                    add_hold_image(st.session_state.username, img.read())
-        
-        images = get_hold_images()
+                # The uploader keeps its file across reruns; add each upload once
+                if img and st.session_state.get("hold_upload_id") != img.file_id:
+                    if add_hold_image(st.session_state.username, img.read()):
+                        st.session_state.hold_upload_id = img.file_id
+        
+        if "hold_image_limit" not in st.session_state:
+            st.session_state.hold_image_limit = HOLD_PAGE_SIZE
+        images = get_hold_images(st.session_state.hold_image_limit)
         if images:
+            store = image_store.get_store()
             for img in images:
-                iid, uploader, data, ts = img
+                iid, uploader, digest, size_bytes, ts = img
+                if digest is None:
+                    continue  # Legacy row that never had image bytes
                 st.markdown(f"""
                 <div class="card">
                     <div style="display: flex; justify-content: space-between;">
@@ -1536,7 +1885,17 @@ else:
                     <p>Uploaded by: {uploader}</p>
                 </div>
                 """, unsafe_allow_html=True)
-                st.image(Image.open(io.BytesIO(data)), use_container_width=True)
+                # Thumbnails are built in the background; older uploads get theirs on first view
+                if not os.path.exists(store.variant_path(digest, "thumb")):
+                    image_store.submit_variants(digest)
+                if st.toggle("View full size", key=f"hold_full_{iid}"):
+                    st.image(store.best_path(digest, "display"), use_container_width=True)
+                else:
+                    st.image(store.best_path(digest, "thumb"))
+            if len(images) == st.session_state.hold_image_limit:
+                if st.button("Show older images"):
+                    st.session_state.hold_image_limit += HOLD_PAGE_SIZE
+                    st.rerun()
         else:
             st.info("No images in HOLD")
 
@@ -1578,56 +1937,138 @@ else:
                         """, unsafe_allow_html=True)
 
         with col2:
-            st.markdown("""
-            ### Lycamobile Fancy Number Policy
-            **Qualifying Patterns (last 6 digits only):**
-            
-            #### 6-Digit Patterns
-            - 123456 (ascending)
-            - 987654 (descending)
-            - 666666 (repeating)
-            - 100001 (palindrome)
-            
-            #### 3-Digit Patterns  
-            - 444 555 (double triplets)
-            - 121 122 (similar triplets)
-            - 786 786 (repeating triplets)
-            - 457 456 (nearly sequential)
-            
-            #### 2-Digit Patterns
-            - 11 12 13 (incremental)
-            - 20 20 20 (repeating)
-            - 01 01 01 (alternating)
-            - 32 42 52 (stepping)
-            
-            #### Exceptional Cases
-            - Ending with 123/555/777/999
-            """)
+            st.markdown("### Lycamobile Fancy Number Policy\n"
+                        "**Qualifying Patterns (last 6 digits only):**\n\n"
+                        + "\n".join(f"- {name}" for name in fancy_number.rule_names()))
+
+
+        st.markdown("---")
+        st.subheader("🔎 Find Fancy Numbers")
+        with st.form("fancy_search_form"):
+            search_by = st.radio("Search by", ["Prefix", "Range"], horizontal=True)
+            cols = st.columns(2)
+            prefix = cols[0].text_input("Prefix", placeholder="e.g., 4479")
+            number_length = cols[1].number_input("Number length (digits)", min_value=6, max_value=15, value=11)
+            cols = st.columns(2)
+            range_start = cols[0].text_input("From", placeholder="e.g., 44790000000")
+            range_end = cols[1].text_input("To", placeholder="e.g., 44799999999")
+            pattern_names = fancy_number.rule_names()
+            wanted = st.multiselect("Patterns", pattern_names, default=pattern_names)
+            if st.form_submit_button("Search"):
+                mask = fancy_number.pattern_bits(wanted)
+                started = datetime.now()
+                if search_by == "Prefix":
+                    total, numbers = fancy_number.search_prefix(prefix, int(number_length), mask, FANCY_SEARCH_LIMIT)
+                else:
+                    start_digits = re.sub(r'\D', '', range_start)
+                    end_digits = re.sub(r'\D', '', range_end)
+                    if len(end_digits) < 6 or not start_digits:
+                        st.warning("Enter both ends of the range (at least 6 digits)")
+                        total, numbers = 0, []
+                    else:
+                        total, found = fancy_number.search_range(int(start_digits), int(end_digits), mask,
+                                                                 FANCY_SEARCH_LIMIT)
+                        numbers = [f"{number:0{len(end_digits)}d}" for number in found]
+                elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+                if not mask:
+                    st.warning("Please pick at least one pattern")
+                elif numbers:
+                    shown = f" (showing the first {len(numbers):,})" if total > len(numbers) else ""
+                    st.success(f"{total:,} matching numbers found in {elapsed_ms:.1f} ms{shown}")
+                    st.dataframe(pd.DataFrame([{
+                        "Number": number,
+                        "Pattern": is_fancy_number(number)[1]
+                    } for number in numbers]))
+                else:
+                    st.info("No matching numbers in that range")
+
+        st.markdown("---")
+        st.subheader("📋 Batch Check")
+        numbers_file = st.file_uploader("Upload numbers (CSV or TXT, one number per line or in the first column)",
+                                        type=["csv", "txt"])
+        pasted_numbers = st.text_area("Or paste numbers, one per line")
+        if st.button("🔍 Check List"):
+            numbers = [line.strip() for line in pasted_numbers.splitlines() if line.strip()]
+            if numbers_file is not None:
+                numbers += pd.read_csv(numbers_file, header=None, usecols=[0], dtype=str,
+                                       skip_blank_lines=True)[0].dropna().tolist()
+            if not numbers:
+                st.warning("Please upload or paste at least one number")
+            else:
+                started = datetime.now()
+                fancy, _ = is_fancy_number_batch(numbers)
+                elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+                fancy_numbers = [number for number, is_fancy in zip(numbers, fancy) if is_fancy]
+                st.success(f"{len(fancy_numbers)} fancy out of {len(numbers)} numbers "
+                           f"(classified in {elapsed_ms:.0f} ms)")
+                if fancy_numbers:
+                    df = pd.DataFrame([{
+                        "Number": number,
+                        "Last 6 digits": re.sub(r'\D', '', number)[-6:],
+                        "Pattern": is_fancy_number(number)[1]
+                    } for number in fancy_numbers])
+                    st.dataframe(df)
+                    st.download_button(
+                        label="Download fancy numbers as CSV",
+                        data=df.to_csv(index=False).encode('utf-8'),
+                        file_name="fancy_numbers.csv",
+                        mime="text/csv"
+                    )
+
+        with st.expander("🗂️ Inventory Scan (large exports)"):
+            st.caption("Scans a full number-range export in the background, in parallel chunks, "
+                       "and collects the fancy numbers into a CSV.")
+            with st.form("fancy_scan_form"):
+                inventory_file = st.file_uploader("Number export (CSV or TXT)", type=["csv", "txt"])
+                number_column = st.number_input("Column holding the number (first column = 0)",
+                                                min_value=0, value=0, step=1)
+                header_row = st.radio("First row is a header", ["Detect", "Yes", "No"], horizontal=True)
+                if st.form_submit_button("Start Scan"):
+                    if inventory_file is None:
+                        st.warning("Please upload a file to scan")
+                    else:
+                        job = fancy_scan.start_job(inventory_file.name, inventory_file, column=int(number_column),
+                                                   header={"Detect": None, "Yes": True, "No": False}[header_row])
+                        st.session_state.fancy_scan_job = job.id
+
+            job = fancy_scan.get_job(st.session_state.get("fancy_scan_job"))
+            if job is not None:
+                polling = job.status in ("queued", "running")
+
+                @st.fragment(run_every=FANCY_SCAN_REFRESH_SECONDS if polling else None)
+                def fancy_scan_progress(job_id, polling):
+                    job = fancy_scan.get_job(job_id)
+                    if polling and job.status not in ("queued", "running"):
+                        # Finished: a full rerun redraws this without the timer
+                        st.rerun()
+                    st.progress(job.fraction, text=f"{job.name}: {job.status} — {job.rows:,} scanned, "
+                                                   f"{job.matches:,} fancy")
+                    if job.status == "done":
+                        st.success(f"Scanned {job.rows:,} numbers in {job.finished - job.started:.1f}s")
+                        with open(job.output_path, "rb") as f:
+                            st.download_button(
+                                label="Download fancy numbers as CSV",
+                                data=f.read(),
+                                file_name=f"fancy_{os.path.splitext(job.name)[0]}.csv",
+                                mime="text/csv"
+                            )
+                    elif job.status == "failed":
+                        st.error(f"Scan failed: {job.error}")
+
+                fancy_scan_progress(job.id, polling)
 
         # Test cases
         debug_mode = st.checkbox("Show test cases", False)
         if debug_mode:
-            test_numbers = [
-                ("16109055580", False),  # 055580 → No pattern ✗
-                ("123456", True),       # 6-digit ascending ✓
-                ("444555", True),       # Double triplets ✓
-                ("121122", True),       # Similar triplets ✓ 
-                ("111213", True),       # Incremental pairs ✓
-                ("202020", True),       # Repeating pairs ✓
-                ("010101", True),       # Alternating pairs ✓
-                ("324252", True),       # Stepping pairs ✓
-                ("7900000123", True),   # Ends with 123 ✓
-                ("123458", False),      # No pattern ✗
-                ("112233", False),      # Not in our strict rules ✗
-                ("555555", True)        # 6 identical digits ✓
-            ]
-            
             st.markdown("### Strict Policy Validation")
-            for number, expected in test_numbers:
+            st.caption("Expected results follow the bundled rules and the golden corpus "
+                       "(scripts/check_fancy_golden.py); edited rules may disagree.")
+            for number, expected, why in fancy_number.POLICY_EXAMPLES:
                 is_fancy, pattern = is_fancy_number(number)
                 result = "PASS" if is_fancy == expected else "FAIL"
                 color = "green" if result == "PASS" else "red"
-                st.write(f"<span style='color:{color}'>{number[-6:]}: {result} ({pattern})</span>", unsafe_allow_html=True)
+                st.write(f"<span style='color:{color}'>{number[-6:]}: {result} — {why} ({pattern})</span>",
+                         unsafe_allow_html=True)
 
     elif st.session_state.current_section == "late_login":
         st.subheader("⏰ Late Login Report")
@@ -1661,19 +2102,22 @@ else:
                         st.error("Invalid time format. Please use HH:MM format (e.g., 08:30)")
         
         st.subheader("Late Login Records")
-        late_logins = get_late_logins()
+        created_range = date_range_filter("late_logins_date_range")
         
         if st.session_state.role == "admin":
+            late_logins = get_late_logins(created_range=created_range)
             if late_logins:
                 # Prepare data for download
                 data = []
                 for login in late_logins:
-                    _, agent, presence, login_time, reason, ts = login
+                    _, agent, presence, login_time, reason, ts, minutes_late = login
                     data.append({
                         "Agent's Name": agent,
                         "Time of presence": presence,
                         "Time of log in": login_time,
-                        "Reason": reason
+                        "Minutes late": minutes_late,
+                        "Reason": reason,
+                        "Reported at": ts
                     })
                 
                 df = pd.DataFrame(data)
@@ -1695,16 +2139,18 @@ else:
                 st.info("No late login records found")
         else:
             # For agents, only show their own records
-            user_logins = [login for login in late_logins if login[1] == st.session_state.username]
+            user_logins = get_late_logins(st.session_state.username, created_range)
             if user_logins:
                 data = []
                 for login in user_logins:
-                    _, agent, presence, login_time, reason, ts = login
+                    _, agent, presence, login_time, reason, ts, minutes_late = login
                     data.append({
                         "Agent's Name": agent,
                         "Time of presence": presence,
                         "Time of log in": login_time,
-                        "Reason": reason
+                        "Minutes late": minutes_late,
+                        "Reason": reason,
+                        "Reported at": ts
                     })
                 
                 df = pd.DataFrame(data)
@@ -1746,9 +2192,10 @@ else:
                         st.error("Invalid time format. Please use HH:MM format (e.g., 14:30)")
         
         st.subheader("Quality Issue Records")
-        quality_issues = get_quality_issues()
+        created_range = date_range_filter("quality_issues_date_range")
         
         if st.session_state.role == "admin":
+            quality_issues = get_quality_issues(created_range=created_range)
             if quality_issues:
                 # Prepare data for download
                 data = []
@@ -1759,7 +2206,8 @@ else:
                         "Type of issue": issue_type,
                         "Timing": timing,
                         "Mobile number": mobile,
-                        "Product": product
+                        "Product": product,
+                        "Reported at": ts
                     })
                 
                 df = pd.DataFrame(data)
@@ -1781,7 +2229,7 @@ else:
                 st.info("No quality issue records found")
         else:
             # For agents, only show their own records
-            user_issues = [issue for issue in quality_issues if issue[1] == st.session_state.username]
+            user_issues = get_quality_issues(st.session_state.username, created_range)
             if user_issues:
                 data = []
                 for issue in user_issues:
@@ -1791,7 +2239,8 @@ else:
                         "Type of issue": issue_type,
                         "Timing": timing,
                         "Mobile number": mobile,
-                        "Product": product
+                        "Product": product,
+                        "Reported at": ts
                     })
                 
                 df = pd.DataFrame(data)
@@ -1831,19 +2280,22 @@ else:
                         st.error("Invalid time format. Please use HH:MM format (e.g., 10:00)")
         
         st.subheader("Mid-shift Issue Records")
-        midshift_issues = get_midshift_issues()
+        created_range = date_range_filter("midshift_issues_date_range")
         
         if st.session_state.role == "admin":
+            midshift_issues = get_midshift_issues(created_range=created_range)
             if midshift_issues:
                 # Prepare data for download
                 data = []
                 for issue in midshift_issues:
-                    _, agent, issue_type, start_time, end_time, ts = issue
+                    _, agent, issue_type, start_time, end_time, ts, duration = issue
                     data.append({
                         "Agent's Name": agent,
                         "Issue Type": issue_type,
                         "Start time": start_time,
-                        "End Time": end_time
+                        "End Time": end_time,
+                        "Duration (min)": duration,
+                        "Reported at": ts
                     })
                 
                 df = pd.DataFrame(data)
@@ -1865,16 +2317,18 @@ else:
                 st.info("No mid-shift issue records found")
         else:
             # For agents, only show their own records
-            user_issues = [issue for issue in midshift_issues if issue[1] == st.session_state.username]
+            user_issues = get_midshift_issues(st.session_state.username, created_range)
             if user_issues:
                 data = []
                 for issue in user_issues:
-                    _, agent, issue_type, start_time, end_time, ts = issue
+                    _, agent, issue_type, start_time, end_time, ts, duration = issue
                     data.append({
                         "Agent's Name": agent,
                         "Issue Type": issue_type,
                         "Start time": start_time,
-                        "End Time": end_time
+                        "End Time": end_time,
+                        "Duration (min)": duration,
+                        "Reported at": ts
                     })
                 
                 df = pd.DataFrame(data)
@@ -1936,6 +2390,20 @@ else:
                         st.success("All mistakes deleted!")
                         st.rerun()
 
+        with st.expander("🗄️ Archive Old Chat Messages"):
+            chunks, archived_messages, archived_bytes = get_chat_archive_stats()
+            st.caption(f"Archive: {archived_messages} messages in {chunks} chunks "
+                       f"({archived_bytes / 1024:.1f} KB compressed). Runs automatically once a day.")
+            with st.form("archive_chat_form"):
+                retention_days = st.number_input("Keep messages from the last N days in the live chat",
+                                                 min_value=1, value=CHAT_RETENTION_DAYS)
+                if st.form_submit_button("Archive Now"):
+                    if is_killswitch_enabled():
+                        st.error("System is currently locked. Please contact the developer.")
+                    else:
+                        archived = archive_group_messages(int(retention_days))
+                        st.success(f"Archived {archived} messages!")
+
         with st.expander("❌ Clear All Chat Messages"):
             with st.form("clear_chat_form"):
                 st.warning("This will permanently delete ALL chat messages!")
@@ -2002,6 +2470,27 @@ else:
                     except Exception as e:
                         st.error(f"Error during deletion: {str(e)}")
         
+        st.markdown("---")
+        st.subheader("📱 Fancy Number Rules")
+        st.caption("Rule types: " + ", ".join(fancy_number.RULE_TYPES) + ". Rules apply in order, "
+                   "and a saved change takes effect on the next check without a restart.")
+        if fancy_number.rules_error():
+            st.error(f"The rules file failed to load; the previous rules still apply. {fancy_number.rules_error()}")
+        with st.form("fancy_rules_form"):
+            rules_json = st.text_area("Rules (JSON)", fancy_number.rules_text(), height=400)
+            if st.form_submit_button("Save Rules"):
+                if is_killswitch_enabled():
+                    st.error("System is currently locked. Please contact the developer.")
+                else:
+                    try:
+                        ruleset = fancy_number.save_rules(rules_json)
+                        st.success(f"Saved {len(ruleset.names)} rules!")
+                    except ValueError as e:
+                        st.error(f"Rules not saved: {e}")
+        if st.button("Reset Fancy Number Rules to Defaults") and not is_killswitch_enabled():
+            fancy_number.reset_rules()
+            st.rerun()
+
         st.markdown("---")
         st.subheader("User Management")
         if not is_killswitch_enabled():
@@ -0,0 +1,303 @@
+import bisect
+import heapq
+from datetime import datetime
+
+# --------------------------
+# Break Booking Engine
+# --------------------------
+#
+# Seat checks and inserts happen inside one IMMEDIATE transaction, so two
+# agents racing for the last seat are serialized by SQLite's write lock
+# instead of both passing a stale count. Seat counts come from the
+# break_occupancy table, which triggers keep in step with break_bookings; the
+# unique index on (break_id, booking_date, user_id) backs up the
+# one-booking-per-user rule.
+
+BOOKED = "booked"
+FULL = "full"
+ALREADY_BOOKED = "already_booked"
+NO_SUCH_SLOT = "no_such_slot"
+CANCELLED = "cancelled"
+NOT_BOOKED = "not_booked"
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def book_seat(conn, break_id, user_id, username, booking_date, now=None):
+    """Book ``user_id`` into a break on ``booking_date``; returns one of the status constants."""
+    timestamp = (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    # Waits up to busy_timeout for other writers, then holds the lock to commit
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        slot = conn.execute("SELECT max_users FROM breaks WHERE id = ?", (break_id,)).fetchone()
+        if slot is None:
+            status = NO_SUCH_SLOT
+        elif conn.execute("""
+            SELECT 1 FROM break_bookings
+            WHERE break_id = ? AND booking_date = ? AND user_id = ?
+        """, (break_id, booking_date, user_id)).fetchone():
+            status = ALREADY_BOOKED
+        elif booked_seats(conn, break_id, booking_date) >= slot[0]:
+            status = FULL
+        else:
+            conn.execute("""
+                INSERT INTO break_bookings (break_id, user_id, username, booking_date, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, (break_id, user_id, username, booking_date, timestamp))
+            status = BOOKED
+        conn.commit()
+        return status
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def cancel_seat(conn, break_id, user_id, booking_date):
+    """Release ``user_id``'s seat in a break on ``booking_date``; returns CANCELLED or NOT_BOOKED."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        deleted = conn.execute("""
+            DELETE FROM break_bookings
+            WHERE break_id = ? AND booking_date = ? AND user_id = ?
+        """, (break_id, booking_date, user_id)).rowcount
+        conn.commit()
+        return CANCELLED if deleted else NOT_BOOKED
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def booked_seats(conn, break_id, booking_date):
+    row = conn.execute("""
+        SELECT booked FROM break_occupancy
+        WHERE break_id = ? AND booking_date = ?
+    """, (break_id, booking_date)).fetchone()
+    return row[0] if row else 0
+
+
+def slot_availability(conn, booking_date, user_id=None):
+    """Every break slot with its remaining seats on ``booking_date``, in start-time order.
+
+    Rows are (id, break_name, start_time, end_time, max_users, remaining,
+    booked_by_user).
+    """
+    return conn.execute("""
+        SELECT b.id, b.break_name, b.start_time, b.end_time, b.max_users,
+               b.max_users - IFNULL(o.booked, 0),
+               EXISTS (SELECT 1 FROM break_bookings bb
+                       WHERE bb.break_id = b.id AND bb.booking_date = ? AND bb.user_id = ?)
+        FROM breaks b
+        LEFT JOIN break_occupancy o ON o.break_id = b.id AND o.booking_date = ?
+        ORDER BY b.start_time
+    """, (booking_date, user_id, booking_date)).fetchall()
+
+
+def plan_schedule(slots, agents, preferences=None):
+    """Assign each agent one slot, filling slots evenly; pure, no database access.
+
+    ``slots`` is [(break_id, start_time, max_users, booked)], ``agents`` is
+    [(user_id, username)] and ``preferences`` maps user_id to break ids in order
+    of preference. Agents with preferences are placed first and get the first
+    preferred slot with a free seat; everyone else (and anyone whose
+    preferences are all full) goes to the slot with the lowest fill ratio,
+    earliest start first. Returns (assignments, unassigned) where assignments
+    is [(break_id, user_id, username)].
+    """
+    preferences = preferences or {}
+    capacity = {break_id: max_users for break_id, _, max_users, _ in slots}
+    booked = {break_id: booked for break_id, _, _, booked in slots}
+    start = {break_id: start_time for break_id, start_time, _, _ in slots}
+
+    def entry(break_id):
+        return (booked[break_id] / capacity[break_id], start[break_id], break_id, booked[break_id])
+
+    # Lazy heap: an entry is stale once the slot's booked count moved on
+    heap = [entry(break_id) for break_id in capacity if capacity[break_id] > booked[break_id]]
+    heapq.heapify(heap)
+
+    def least_loaded():
+        while heap:
+            _, _, break_id, seen = heapq.heappop(heap)
+            if seen == booked[break_id] and booked[break_id] < capacity[break_id]:
+                return break_id
+        return None
+
+    assignments, unassigned = [], []
+    ordered = sorted(agents, key=lambda agent: agent[0] not in preferences)
+    for user_id, username in ordered:
+        break_id = next((preferred for preferred in preferences.get(user_id, ())
+                         if booked.get(preferred, 0) < capacity.get(preferred, 0)), None)
+        if break_id is None:
+            break_id = least_loaded()
+        if break_id is None:
+            unassigned.append((user_id, username))
+            continue
+        booked[break_id] += 1
+        if booked[break_id] < capacity[break_id]:
+            heapq.heappush(heap, entry(break_id))
+        assignments.append((break_id, user_id, username))
+    return assignments, unassigned
+
+
+def auto_schedule(conn, booking_date, preferences=None, now=None):
+    """Give every agent without a break on ``booking_date`` a seat, in one transaction.
+
+    Returns (assignments, unassigned) as plan_schedule does.
+    """
+    timestamp = (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        slots = conn.execute("""
+            SELECT b.id, b.start_time, b.max_users, IFNULL(o.booked, 0)
+            FROM breaks b
+            LEFT JOIN break_occupancy o ON o.break_id = b.id AND o.booking_date = ?
+            WHERE b.max_users > 0
+        """, (booking_date,)).fetchall()
+        agents = conn.execute("""
+            SELECT u.id, u.username FROM users u
+            WHERE u.role = 'agent'
+              AND NOT EXISTS (SELECT 1 FROM break_bookings bb
+                              WHERE bb.user_id = u.id AND bb.booking_date = ?)
+            ORDER BY u.username
+        """, (booking_date,)).fetchall()
+        assignments, unassigned = plan_schedule(slots, agents, preferences)
+        conn.executemany("""
+            INSERT INTO break_bookings (break_id, user_id, username, booking_date, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(break_id, user_id, username, booking_date, timestamp)
+              for break_id, user_id, username in assignments])
+        conn.commit()
+        return assignments, unassigned
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def parse_hhmm(value):
+    """Minutes since midnight for an "HH:MM" string; raises ValueError otherwise."""
+    parsed = datetime.strptime(value.strip(), "%H:%M")
+    return parsed.hour * 60 + parsed.minute
+
+
+def slot_interval(start_time, end_time):
+    """Half-open [start, end) minutes for a slot; a slot ending past midnight runs into the next day."""
+    start, end = parse_hhmm(start_time), parse_hhmm(end_time)
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return start, end
+
+
+class IntervalIndex:
+    """Static index over half-open [start, end) intervals carrying a payload.
+
+    An augmented interval tree: the intervals, sorted by start, form an
+    implicit balanced search tree (each range's middle element is its root),
+    and every node records the furthest end in its subtree. A query skips
+    subtrees that end before the window and everything starting after it,
+    so it visits O((k + 1) log n) nodes for k matches, however long any
+    single interval is.
+    """
+
+    def __init__(self, intervals):
+        self._intervals = sorted(intervals, key=lambda interval: interval[:2])
+        self._starts = [start for start, _, _ in self._intervals]
+        # _subtree_end[mid] is the furthest end in the subtree rooted at mid
+        self._subtree_end = [0] * len(self._intervals)
+        self._build(0, len(self._intervals))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        reach = max(self._intervals[mid][1], self._build(lo, mid), self._build(mid + 1, hi))
+        self._subtree_end[mid] = reach
+        return reach
+
+    @classmethod
+    def from_slots(cls, slots):
+        """Build from (start_time, end_time, payload) rows, skipping malformed times."""
+        intervals = []
+        for start_time, end_time, payload in slots:
+            try:
+                intervals.append((*slot_interval(start_time, end_time), payload))
+            except (TypeError, ValueError):
+                continue
+        return cls(intervals)
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __iter__(self):
+        return iter(self._intervals)
+
+    def overlapping(self, start, end):
+        """Intervals sharing at least one minute with [start, end), in start order."""
+        matches = []
+        # Only intervals starting before the window's end can reach into it
+        self._collect(0, len(self._intervals), bisect.bisect_left(self._starts, end), start, matches)
+        return matches
+
+    def _collect(self, lo, hi, limit, start, matches):
+        # In-order walk of the subtree over [lo, hi), restricted to indexes below limit
+        if lo >= hi or lo >= limit:
+            return
+        mid = (lo + hi) // 2
+        if self._subtree_end[mid] <= start:
+            return
+        self._collect(lo, mid, limit, start, matches)
+        if mid < limit:
+            if self._intervals[mid][1] > start:
+                matches.append(self._intervals[mid])
+            self._collect(mid + 1, hi, limit, start, matches)
+
+    def overlapping_daily(self, start, end):
+        """Like overlapping(), but on a 24h clock: slots crossing midnight meet the next morning.
+
+        Matches from the neighbouring day come back shifted into the window's frame.
+        """
+        matches = self.overlapping(start, end)
+        for shift in (MINUTES_PER_DAY, -MINUTES_PER_DAY):
+            matches += [(lo - shift, hi - shift, payload)
+                        for lo, hi, payload in self.overlapping(start + shift, end + shift)]
+        return matches
+
+    def at(self, minute):
+        """Intervals covering ``minute``, including ones that started the day before."""
+        return self.overlapping_daily(minute, minute + 1)
+
+
+def coverage(intervals, weight=lambda payload: 1):
+    """Sweep line over (start, end, payload) intervals: weight summed per minute of the day.
+
+    Intervals running past midnight wrap onto the start of the day.
+    """
+    deltas = [0] * (MINUTES_PER_DAY + 1)
+    for start, end, payload in intervals:
+        amount = weight(payload)
+        for lo, hi in ((start, min(end, MINUTES_PER_DAY)), (0, end - MINUTES_PER_DAY)):
+            if hi > lo:
+                deltas[lo] += amount
+                deltas[hi] -= amount
+    totals, running = [], 0
+    for delta in deltas[:MINUTES_PER_DAY]:
+        running += delta
+        totals.append(running)
+    return totals
+
+
+def peak_load(index, start, end, extra=0, weight=lambda payload: 1):
+    """Highest summed weight in [start, end) over the indexed intervals, plus ``extra``.
+
+    Only intervals overlapping the window take part in the sweep.
+    """
+    events = []
+    for lo, hi, payload in index.overlapping_daily(start, end):
+        events.append((max(lo, start), weight(payload)))
+        events.append((min(hi, end), -weight(payload)))
+    # Ends sort before starts at the same minute: back-to-back slots don't overlap
+    events.sort(key=lambda event: (event[0], event[1]))
+    peak = running = 0
+    for _, delta in events:
+        running += delta
+        peak = max(peak, running)
+    return peak + extra
@@ -0,0 +1,783 @@
+import csv
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import weakref
+import zlib
+from datetime import datetime
+
+# --------------------------
+# Connection Management
+# --------------------------
+#
+# Streamlit re-executes "USA FORM.py" on every rerun, but imported modules stay
+# in sys.modules, so the pool below lives for the whole server process and is
+# shared by every session.
+
+DB_DIR = "data"
+DB_PATH = os.path.join(DB_DIR, "requests.db")
+
+# Applied once when a connection is opened, never per query.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = OFF",
+)
+
+MAX_IDLE_CONNECTIONS = 8
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection whose close() hands it back to the pool instead of closing it.
+
+    Callers keep the old ``try: ... finally: conn.close()`` shape; anything
+    left uncommitted is rolled back, exactly as a real close would do.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+class _Lease:
+    """Thread-local handle; when the thread dies the connection goes back idle."""
+
+    def __init__(self, pool, conn):
+        self.conn = conn
+        weakref.finalize(self, pool._release, conn)
+
+
+class ConnectionPool:
+    """Hands out one configured connection per thread and recycles them.
+
+    Streamlit runs every script rerun in a fresh thread, so a plain
+    ``threading.local`` would still open one connection per rerun. Instead the
+    connection is returned to an idle list when its thread finishes and the
+    next rerun picks it up again.
+    """
+
+    def __init__(self, path=DB_PATH, max_idle=MAX_IDLE_CONNECTIONS):
+        self.path = path
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._idle = []
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def connect(self):
+        """Open a new, fully configured connection (bypasses the pool)."""
+        conn = sqlite3.connect(self.path, factory=PooledConnection,
+                               check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def get(self):
+        """Return the calling thread's connection, reusing an idle one if possible."""
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self.connect()
+            lease = _Lease(self, conn)
+            self._local.lease = lease
+        return lease.conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.really_close()
+
+    def close_all(self):
+        """Close idle connections and the calling thread's connection."""
+        lease = getattr(self._local, "lease", None)
+        if lease is not None:
+            del self._local.lease
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.really_close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool for the application database."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_connection():
+    """Return the calling thread's pooled connection to the application database."""
+    return get_pool().get()
+
+
+# --------------------------
+# Schema Migrations
+# --------------------------
+#
+# The schema version lives in PRAGMA user_version. Each migration runs in its
+# own IMMEDIATE transaction together with the version bump, so a half-applied
+# migration is never recorded and concurrent processes apply it only once.
+
+SEED_USERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed_users.csv")
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def load_seed_users(path=SEED_USERS_PATH):
+    """Read the (username, password, role) roster shipped with the app."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["username"], row["password"], row["role"]) for row in csv.DictReader(f)]
+
+
+@functools.lru_cache(maxsize=4)
+def mention_pattern(usernames):
+    """Regex matching "@<username>" for any of ``usernames`` (a tuple), longest first.
+
+    Usernames may contain spaces ("@taha kirri"), so they are matched as whole
+    names rather than with a generic ``@\\w+``.
+    """
+    names = sorted(usernames, key=len, reverse=True)
+    if not names:
+        return None
+    return re.compile(r"@(" + "|".join(re.escape(name) for name in names) + r")(?!\w)", re.IGNORECASE)
+
+
+def resolve_mentions(message, users):
+    """Return [(user_id, username)] mentioned in ``message``; ``users`` is [(id, username)]."""
+    pattern = mention_pattern(tuple(username for _, username in users))
+    if pattern is None:
+        return []
+    by_name = {username.lower(): (user_id, username) for user_id, username in users}
+    resolved = {}
+    for match in pattern.finditer(message):
+        user = by_name[match.group(1).lower()]
+        resolved[user[0]] = user
+    return list(resolved.values())
+
+
+def _migration_001_baseline(conn):
+    # Idempotent so databases created before versioning adopt it unchanged.
+    for statement in (
+        """CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT,
+            role TEXT CHECK(role IN ('agent', 'admin')))""",
+        """CREATE TABLE IF NOT EXISTS requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_name TEXT,
+            request_type TEXT,
+            identifier TEXT,
+            comment TEXT,
+            timestamp TEXT,
+            completed INTEGER DEFAULT 0)""",
+        """CREATE TABLE IF NOT EXISTS mistakes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_leader TEXT,
+            agent_name TEXT,
+            ticket_id TEXT,
+            error_description TEXT,
+            timestamp TEXT)""",
+        """CREATE TABLE IF NOT EXISTS group_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender TEXT,
+            message TEXT,
+            timestamp TEXT,
+            mentions TEXT)""",
+        """CREATE TABLE IF NOT EXISTS hold_images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uploader TEXT,
+            image_data BLOB,
+            timestamp TEXT)""",
+        """CREATE TABLE IF NOT EXISTS system_settings (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            killswitch_enabled INTEGER DEFAULT 0,
+            chat_killswitch_enabled INTEGER DEFAULT 0)""",
+        """CREATE TABLE IF NOT EXISTS breaks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            break_name TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            max_users INTEGER,
+            current_users INTEGER DEFAULT 0,
+            created_by TEXT,
+            timestamp TEXT)""",
+        """CREATE TABLE IF NOT EXISTS break_bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            break_id INTEGER,
+            user_id INTEGER,
+            username TEXT,
+            booking_date TEXT,
+            timestamp TEXT,
+            FOREIGN KEY(break_id) REFERENCES breaks(id))""",
+        """CREATE TABLE IF NOT EXISTS request_comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER,
+            user TEXT,
+            comment TEXT,
+            timestamp TEXT,
+            FOREIGN KEY(request_id) REFERENCES requests(id))""",
+        """CREATE TABLE IF NOT EXISTS late_logins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_name TEXT,
+            presence_time TEXT,
+            login_time TEXT,
+            reason TEXT,
+            timestamp TEXT)""",
+        """CREATE TABLE IF NOT EXISTS quality_issues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_name TEXT,
+            issue_type TEXT,
+            timing TEXT,
+            mobile_number TEXT,
+            product TEXT,
+            timestamp TEXT)""",
+        """CREATE TABLE IF NOT EXISTS midshift_issues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_name TEXT,
+            issue_type TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            timestamp TEXT)""",
+    ):
+        conn.execute(statement)
+
+    # Old databases may predate the chat killswitch column
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(system_settings)")]
+    if "chat_killswitch_enabled" not in columns:
+        conn.execute("ALTER TABLE system_settings ADD COLUMN chat_killswitch_enabled INTEGER DEFAULT 0")
+    conn.execute("""
+        INSERT OR IGNORE INTO system_settings (id, killswitch_enabled, chat_killswitch_enabled)
+        VALUES (1, 0, 0)
+    """)
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)",
+        [(username, hash_password(password), role)
+         for username, password, role in load_seed_users()])
+
+
+def _create_fts_index(conn, table, columns):
+    """External-content FTS5 index over ``table`` kept in sync by triggers."""
+    fts = f"{table}_fts"
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column_list}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    # Only text edits touch the index; status toggles leave it alone
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """)
+    conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def _migration_002_full_text_search(conn):
+    _create_fts_index(conn, "requests", ("agent_name", "request_type", "identifier", "comment"))
+    _create_fts_index(conn, "mistakes", ("agent_name", "ticket_id", "error_description"))
+
+
+def _migration_003_request_comment_stats(conn):
+    # Denormalized so the Requests list can show thread size without loading it
+    conn.execute("ALTER TABLE requests ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE requests ADD COLUMN last_comment_at TEXT")
+    conn.execute("""
+        UPDATE requests SET
+            comment_count = (SELECT COUNT(*) FROM request_comments c WHERE c.request_id = requests.id),
+            last_comment_at = (SELECT MAX(timestamp) FROM request_comments c WHERE c.request_id = requests.id)
+    """)
+    conn.execute("""
+        CREATE TRIGGER request_comments_stats_ai AFTER INSERT ON request_comments BEGIN
+            UPDATE requests
+            SET comment_count = comment_count + 1,
+                last_comment_at = MAX(IFNULL(last_comment_at, ''), new.timestamp)
+            WHERE id = new.request_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER request_comments_stats_ad AFTER DELETE ON request_comments BEGIN
+            UPDATE requests
+            SET comment_count = comment_count - 1,
+                last_comment_at = (SELECT MAX(timestamp) FROM request_comments
+                                   WHERE request_id = old.request_id)
+            WHERE id = old.request_id;
+        END
+    """)
+
+
+HOLD_IMAGE_MIGRATION_BATCH = 20
+
+
+def _image_store_for(conn):
+    """The image store next to ``conn``'s database file, as IMAGE_DIR is next to DB_PATH."""
+    # Imported here so the rest of the DB layer doesn't need Pillow
+    import image_store
+
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    return image_store.ImageStore(
+        os.path.join(os.path.dirname(db_file), os.path.basename(image_store.IMAGE_DIR)))
+
+
+def _migration_004_hold_image_files(conn):
+    # Image bytes move to the content-addressed store; rows keep metadata only.
+    # Every upload keeps its row, re-uploads of one file just share the blob.
+    conn.execute("ALTER TABLE hold_images ADD COLUMN sha256 TEXT")
+    conn.execute("ALTER TABLE hold_images ADD COLUMN size_bytes INTEGER")
+    register_backfill(conn, "hold_image_files", "hold_images")
+
+
+def _backfill_hold_image_files(conn, low, high):
+    batch = conn.execute("""
+        SELECT id, image_data FROM hold_images
+        WHERE id > ? AND id <= ? AND image_data IS NOT NULL
+    """, (low, high)).fetchall()
+    if batch:
+        store = _image_store_for(conn)
+        conn.executemany(
+            "UPDATE hold_images SET sha256 = ?, size_bytes = ?, image_data = NULL WHERE id = ?",
+            [(store.put(data), len(data), image_id) for image_id, data in batch])
+
+
+MENTION_MIGRATION_BATCH = 500
+
+
+def _migration_005_message_mentions(conn):
+    conn.execute("""
+        CREATE TABLE message_mentions (
+            message_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            seen INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (message_id, user_id)
+        ) WITHOUT ROWID
+    """)
+    register_backfill(conn, "message_mentions", "group_messages")
+
+
+def _backfill_message_mentions(conn, low, high):
+    # Re-resolve history against real usernames; old mentions count as already seen
+    users = conn.execute("SELECT id, username FROM users").fetchall()
+    batch = conn.execute("SELECT id, message FROM group_messages WHERE id > ? AND id <= ?",
+                         (low, high)).fetchall()
+    for message_id, message in batch:
+        mentioned = resolve_mentions(message or "", users)
+        conn.execute("UPDATE group_messages SET mentions = ? WHERE id = ?",
+                     (",".join(username for _, username in mentioned), message_id))
+        conn.executemany(
+            "INSERT OR IGNORE INTO message_mentions (message_id, user_id, seen) VALUES (?, ?, 1)",
+            [(message_id, user_id) for user_id, _ in mentioned])
+
+
+def _migration_006_group_message_archive(conn):
+    # Chat older than the retention window, a compressed chunk per row
+    conn.execute("""
+        CREATE TABLE group_message_archive (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            first_timestamp TEXT,
+            last_timestamp TEXT,
+            message_count INTEGER NOT NULL,
+            payload BLOB NOT NULL
+        )
+    """)
+
+
+def _migration_007_unique_break_bookings(conn):
+    # One booking per user per slot and date; the unique index is managed below
+    conn.execute("""
+        DELETE FROM break_bookings
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM break_bookings GROUP BY break_id, booking_date, user_id
+        )
+    """)
+
+
+def _migration_008_break_occupancy(conn):
+    # Booked-seat count per slot and date, so availability is a key lookup
+    conn.execute("""
+        CREATE TABLE break_occupancy (
+            break_id INTEGER NOT NULL,
+            booking_date TEXT NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (break_id, booking_date)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO break_occupancy (break_id, booking_date, booked)
+        SELECT break_id, booking_date, COUNT(*) FROM break_bookings
+        GROUP BY break_id, booking_date
+    """)
+    # Maintained in the same transaction as the booking or cancellation
+    conn.execute("""
+        CREATE TRIGGER break_occupancy_ai AFTER INSERT ON break_bookings BEGIN
+            INSERT INTO break_occupancy (break_id, booking_date, booked)
+            VALUES (new.break_id, new.booking_date, 1)
+            ON CONFLICT (break_id, booking_date) DO UPDATE SET booked = booked + 1;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER break_occupancy_ad AFTER DELETE ON break_bookings BEGIN
+            UPDATE break_occupancy SET booked = booked - 1
+            WHERE break_id = old.break_id AND booking_date = old.booking_date;
+            DELETE FROM break_occupancy
+            WHERE break_id = old.break_id AND booking_date = old.booking_date AND booked <= 0;
+        END
+    """)
+
+
+def _migration_009_daily_request_rollup(conn):
+    # Dashboard metrics per day and type; triggers keep it exact on every write
+    conn.execute("""
+        CREATE TABLE daily_request_rollup (
+            day TEXT NOT NULL,
+            request_type TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, request_type)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO daily_request_rollup (day, request_type, total, completed)
+        SELECT IFNULL(substr(timestamp, 1, 10), ''), IFNULL(request_type, ''), COUNT(*),
+               SUM(IFNULL(completed, 0) <> 0)
+        FROM requests
+        GROUP BY 1, 2
+    """)
+    # Bumped by every rollup change so readers can cache per version
+    conn.execute("CREATE TABLE data_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute("INSERT INTO data_versions (name, version) VALUES ('requests', 0)")
+
+    add = """
+        INSERT INTO daily_request_rollup (day, request_type, total, completed)
+        VALUES (IFNULL(substr(new.timestamp, 1, 10), ''), IFNULL(new.request_type, ''), 1, IFNULL(new.completed, 0) <> 0)
+        ON CONFLICT (day, request_type) DO UPDATE SET
+            total = total + 1, completed = completed + excluded.completed;
+    """
+    remove = """
+        UPDATE daily_request_rollup SET total = total - 1, completed = completed - (IFNULL(old.completed, 0) <> 0)
+        WHERE day = IFNULL(substr(old.timestamp, 1, 10), '') AND request_type = IFNULL(old.request_type, '');
+        DELETE FROM daily_request_rollup
+        WHERE day = IFNULL(substr(old.timestamp, 1, 10), '') AND request_type = IFNULL(old.request_type, '')
+          AND total <= 0;
+    """
+    bump = "UPDATE data_versions SET version = version + 1 WHERE name = 'requests';"
+    conn.execute(f"CREATE TRIGGER daily_request_rollup_ai AFTER INSERT ON requests BEGIN {add} {bump} END")
+    conn.execute(f"CREATE TRIGGER daily_request_rollup_ad AFTER DELETE ON requests BEGIN {remove} {bump} END")
+    conn.execute(f"""
+        CREATE TRIGGER daily_request_rollup_au AFTER UPDATE OF completed, timestamp, request_type ON requests
+        WHEN (IFNULL(old.completed, 0) <> 0) IS NOT (IFNULL(new.completed, 0) <> 0)
+          OR old.timestamp IS NOT new.timestamp
+          OR old.request_type IS NOT new.request_type
+        BEGIN {remove} {add} {bump} END
+    """)
+
+
+# Log tables that get an integer created_at (Unix seconds) next to their TEXT timestamp
+EPOCH_TABLES = ("requests", "mistakes", "group_messages", "late_logins", "quality_issues", "midshift_issues")
+
+# table -> {minute-of-day column: the free-form "HH:MM" column it is parsed from}
+MINUTE_COLUMNS = {
+    "late_logins": {"presence_minute": "presence_time", "login_minute": "login_time"},
+    "quality_issues": {"timing_minute": "timing"},
+    "midshift_issues": {"start_minute": "start_time", "end_minute": "end_time"},
+}
+
+EPOCH_MIGRATION_BATCH = 5000
+
+
+def minute_of_day(value):
+    """Minutes since midnight for an "HH:MM" string as the forms accept it, else None."""
+    try:
+        parsed = datetime.strptime(value.strip(), "%H:%M")
+    except (AttributeError, ValueError):
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
+def _migration_010_epoch_columns(conn):
+    for table in EPOCH_TABLES:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN created_at INTEGER")
+        for column in MINUTE_COLUMNS.get(table, {}):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        register_backfill(conn, f"epoch_columns:{table}", table)
+        # The app writes created_at itself; this covers rows inserted any other way
+        conn.execute(f"""
+            CREATE TRIGGER {table}_created_at_ai AFTER INSERT ON {table}
+            WHEN new.created_at IS NULL BEGIN
+                UPDATE {table} SET created_at = IFNULL(CAST(strftime('%s', new.timestamp, 'utc') AS INTEGER), 0)
+                WHERE id = new.id;
+            END
+        """)
+
+
+def _backfill_epoch_columns(table, conn, low, high):
+    # Timestamps were written with local datetime.now(); 'utc' converts them
+    # the same way datetime.timestamp() does for new rows. Unparseable ones
+    # get 0 so they still show up under an open date range.
+    conn.create_function("minute_of_day", 1, minute_of_day, deterministic=True)
+    assignments = ", ".join(
+        ["created_at = IFNULL(CAST(strftime('%s', timestamp, 'utc') AS INTEGER), 0)"]
+        + [f"{column} = minute_of_day({source})" for column, source in MINUTE_COLUMNS.get(table, {}).items()])
+    conn.execute(f"UPDATE {table} SET {assignments} WHERE id > ? AND id <= ?", (low, high))
+
+
+def _migration_011_break_load_limit(conn):
+    # Most agents on break at once, checked when adding slots; NULL means no limit
+    conn.execute("ALTER TABLE system_settings ADD COLUMN max_agents_on_break INTEGER")
+
+
+def pack_messages(rows):
+    """Compress (id, sender, message, timestamp, mentions) rows into an archive payload."""
+    return zlib.compress(json.dumps([list(row) for row in rows], separators=(",", ":")).encode("utf-8"), 9)
+
+
+def unpack_messages(payload):
+    """Inverse of pack_messages: the rows as tuples, in id order."""
+    return [tuple(row) for row in json.loads(zlib.decompress(payload).decode("utf-8"))]
+
+
+# (version, migration) pairs; append new ones, never renumber or edit applied ones.
+MIGRATIONS = [
+    (1, _migration_001_baseline),
+    (2, _migration_002_full_text_search),
+    (3, _migration_003_request_comment_stats),
+    (4, _migration_004_hold_image_files),
+    (5, _migration_005_message_mentions),
+    (6, _migration_006_group_message_archive),
+    (7, _migration_007_unique_break_bookings),
+    (8, _migration_008_break_occupancy),
+    (9, _migration_009_daily_request_rollup),
+    (10, _migration_010_epoch_columns),
+    (11, _migration_011_break_load_limit),
+]
+
+# --------------------------
+# Backfills
+# --------------------------
+#
+# Rewriting every existing row inside a migration would hold the write lock
+# for the whole table. Such migrations only change the schema and register a
+# backfill over the ids present at that point; run_backfills() then works
+# through the range one batch per transaction, committing the batch and its
+# progress together. The lock is released between batches, and an
+# interrupted run resumes after the last committed batch.
+
+# name -> (ids per batch, fn(conn, low, high) rewriting ids in (low, high])
+BACKFILLS = {
+    "hold_image_files": (HOLD_IMAGE_MIGRATION_BATCH, _backfill_hold_image_files),
+    "message_mentions": (MENTION_MIGRATION_BATCH, _backfill_message_mentions),
+    **{f"epoch_columns:{table}": (EPOCH_MIGRATION_BATCH, functools.partial(_backfill_epoch_columns, table))
+       for table in EPOCH_TABLES},
+}
+
+
+def register_backfill(conn, name, table):
+    """From a migration: queue backfill ``name`` over the rows ``table`` holds now."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS migration_backfills (
+            name TEXT PRIMARY KEY,
+            done_id INTEGER NOT NULL,
+            end_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+        INSERT INTO migration_backfills (name, done_id, end_id)
+        SELECT ?, 0, MAX(id) FROM {table} HAVING MAX(id) IS NOT NULL
+    """, (name,))
+
+
+def run_backfills(conn):
+    """Finish every registered backfill, a committed batch at a time; returns the names finished."""
+    if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'migration_backfills'").fetchone():
+        return []
+    finished = []
+    for (name,) in conn.execute("SELECT name FROM migration_backfills ORDER BY name").fetchall():
+        batch_size, backfill = BACKFILLS[name]
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read under the lock: another process may be running it too
+                progress = conn.execute(
+                    "SELECT done_id, end_id FROM migration_backfills WHERE name = ?", (name,)).fetchone()
+                if progress is None:
+                    conn.commit()
+                    break
+                done_id, end_id = progress
+                if done_id >= end_id:
+                    conn.execute("DELETE FROM migration_backfills WHERE name = ?", (name,))
+                    conn.commit()
+                    finished.append(name)
+                    break
+                high = min(done_id + batch_size, end_id)
+                backfill(conn, done_id, high)
+                conn.execute("UPDATE migration_backfills SET done_id = ? WHERE name = ?", (high, name))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    return finished
+
+# --------------------------
+# Managed Indexes
+# --------------------------
+#
+# Every secondary index the app relies on, by name. sync_indexes() creates the
+# missing ones and drops any other "idx_" index, so this dict is the single
+# source of truth; scripts/check_query_plans.py verifies the queries use them.
+
+INDEXES = {
+    "idx_users_username_nocase":
+        "CREATE INDEX idx_users_username_nocase ON users (username COLLATE NOCASE)",
+    "idx_requests_created_at":
+        "CREATE INDEX idx_requests_created_at ON requests (created_at)",
+    "idx_requests_completed_created_at":
+        "CREATE INDEX idx_requests_completed_created_at ON requests (completed, created_at)",
+    "idx_request_comments_request":
+        "CREATE INDEX idx_request_comments_request ON request_comments (request_id, timestamp)",
+    "idx_mistakes_created_at":
+        "CREATE INDEX idx_mistakes_created_at ON mistakes (created_at)",
+    "idx_group_messages_created_at":
+        "CREATE INDEX idx_group_messages_created_at ON group_messages (created_at)",
+    "idx_message_mentions_user":
+        "CREATE INDEX idx_message_mentions_user ON message_mentions (user_id, seen, message_id)",
+    "idx_group_message_archive_first_id":
+        "CREATE UNIQUE INDEX idx_group_message_archive_first_id ON group_message_archive (first_id)",
+    "idx_hold_images_timestamp":
+        "CREATE INDEX idx_hold_images_timestamp ON hold_images (timestamp)",
+    "idx_hold_images_digest":
+        "CREATE INDEX idx_hold_images_digest ON hold_images (sha256)",
+    "idx_breaks_start_time":
+        "CREATE INDEX idx_breaks_start_time ON breaks (start_time)",
+    "idx_break_bookings_date_break":
+        "CREATE INDEX idx_break_bookings_date_break ON break_bookings (booking_date, break_id)",
+    "idx_break_bookings_slot_user":
+        "CREATE UNIQUE INDEX idx_break_bookings_slot_user ON break_bookings (break_id, booking_date, user_id)",
+    "idx_break_bookings_user_date":
+        "CREATE INDEX idx_break_bookings_user_date ON break_bookings (username, booking_date)",
+    "idx_break_bookings_user_id_date":
+        "CREATE INDEX idx_break_bookings_user_id_date ON break_bookings (user_id, booking_date)",
+    "idx_late_logins_created_at":
+        "CREATE INDEX idx_late_logins_created_at ON late_logins (created_at)",
+    "idx_late_logins_agent_created_at":
+        "CREATE INDEX idx_late_logins_agent_created_at ON late_logins (agent_name, created_at)",
+    "idx_quality_issues_created_at":
+        "CREATE INDEX idx_quality_issues_created_at ON quality_issues (created_at)",
+    "idx_quality_issues_agent_created_at":
+        "CREATE INDEX idx_quality_issues_agent_created_at ON quality_issues (agent_name, created_at)",
+    "idx_midshift_issues_created_at":
+        "CREATE INDEX idx_midshift_issues_created_at ON midshift_issues (created_at)",
+    "idx_midshift_issues_agent_created_at":
+        "CREATE INDEX idx_midshift_issues_agent_created_at ON midshift_issues (agent_name, created_at)",
+}
+
+
+def sync_indexes(conn):
+    """Create missing managed indexes and drop stale ones; returns (created, dropped)."""
+    existing = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx\\_%' ESCAPE '\\'")}
+    created = [name for name in INDEXES if name not in existing]
+    dropped = sorted(existing - set(INDEXES))
+    if not created and not dropped:
+        return created, dropped
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for name in dropped:
+            conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+        for name in created:
+            conn.execute(INDEXES[name])
+        conn.execute("ANALYZE")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return created, dropped
+
+
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Apply every pending migration on ``conn``; returns the versions applied."""
+    applied = []
+    for version, migration in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if schema_version(conn) < version:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+
+def migrate(pool=None):
+    """Bring the database up to date once per process; later calls are free."""
+    pool = pool or get_pool()
+    if pool.path in _migrated_paths:
+        return
+    with _migrate_lock:
+        if pool.path in _migrated_paths:
+            return
+        conn = pool.get()
+        try:
+            apply_migrations(conn)
+            run_backfills(conn)
+            sync_indexes(conn)
+        finally:
+            conn.close()
+        _migrated_paths.add(pool.path)
@@ -0,0 +1,599 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from itertools import product
+
+import numpy as np
+
+# --------------------------
+# Fancy Number Classification
+# --------------------------
+#
+# Lycamobile policy only looks at the last six digits (plus a few VIP
+# numbers), so every suffix is classified once into a 10^6-entry table of
+# pattern bitmasks (4 MB) and a check becomes a single lookup.
+#
+# The rules themselves are declared in fancy_rules.json: each one names a
+# rule type and its parameters, and compiles to a condition on the suffix
+# string, the same condition over a NumPy digit matrix, and a small superset
+# of candidate suffixes, so building the table evaluates a few thousand
+# suffixes instead of a million. Admins edit the file from the app; it is
+# re-read whenever its mtime changes.
+
+SUFFIX_DIGITS = 6
+SUFFIX_COUNT = 10 ** SUFFIX_DIGITS
+
+# Rule bits and the VIP bit must fit the table's 32-bit entries
+MAX_RULES = 31
+VIP_BIT = 1 << MAX_RULES
+
+# Suffix indexes kept per rule set, most recently used first; any pattern
+# combination can be searched, so the rest are rebuilt (a few ms) on demand
+SUFFIX_INDEX_CACHE_SIZE = 8
+
+NOT_FANCY = "No qualifying fancy pattern"
+TOO_SHORT = "Number too short (need at least 6 digits)"
+
+# (number, fancy under the bundled rules, why) shown as the checker's test
+# cases; scripts/check_fancy_golden.py keeps them in line with the corpus
+POLICY_EXAMPLES = (
+    ("16109055580", False, "055580: no pattern"),
+    ("123456", True, "6-digit ascending sequence"),
+    ("987654", True, "6-digit descending sequence"),
+    ("555555", True, "6 identical digits, among others"),
+    ("100001", True, "6-digit palindrome"),
+    ("566655", True, "ABBBAA pattern"),
+    ("444555", True, "Double triplets"),
+    ("550660", True, "Similar triplets"),
+    ("786786", True, "Repeating triplets"),
+    ("457456", True, "Nearly sequential triplets"),
+    ("121122", True, "Nearly sequential triplets (121/122), not similar triplets"),
+    ("202020", True, "Repeating and alternating pairs"),
+    ("010101", True, "Repeating and alternating pairs"),
+    ("111213", False, "Overlapping pairs 11, 11, 12, 21, 13 do not increment"),
+    ("324252", False, "Stepping pairs cannot match overlapping pairs"),
+    ("7900000123", True, "Exceptional case (123)"),
+    ("13322866688", True, "Special VIP number"),
+    ("123458", False, "No pattern"),
+    ("112233", False, "Not in the rules"),
+    ("12345", False, "Too short"),
+)
+
+RULES_PATH = os.path.join("data", "fancy_rules.json")
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fancy_rules.json")
+RULES_CHECK_SECONDS = 1.0
+
+_ASCII_SUFFIX = re.compile(r"[0-9]{6}\Z")
+_NON_DIGITS = re.compile(r'\D')
+_POWERS = 10 ** np.arange(SUFFIX_DIGITS - 1, -1, -1)
+
+
+def clean_digits(phone_number):
+    """``phone_number`` with everything but digits removed."""
+    return _NON_DIGITS.sub('', phone_number)
+
+
+def is_sequential(digits, step=1):
+    """Check if digits form a sequential pattern with given step"""
+    try:
+        return all(int(digits[i]) == int(digits[i-1]) + step for i in range(1, len(digits)))
+    except ValueError:
+        return False
+
+
+def _pairs(s):
+    # Overlapping pairs: 111213 -> 11, 11, 12, 21, 13
+    return [s[i:i+2] for i in range(0, 5, 1)]
+
+
+def _suffix(digits):
+    value = 0
+    for digit in digits:
+        value = value * 10 + digit
+    return value
+
+
+def _arithmetic(start, step, length):
+    digits = [start + step * i for i in range(length)]
+    return digits if all(0 <= digit <= 9 for digit in digits) else None
+
+
+# --------------------------
+# Rule types
+# --------------------------
+#
+# Each compiler takes a rule's parameters and returns (matches, vector_matches,
+# candidates): matches(s) tests a six-character digit string, comparing
+# characters where the rule compares digits as text and int() values where it
+# does arithmetic (so other Unicode digits behave as they always did);
+# vector_matches(d) tests every row of an (n, 6) digit matrix; candidates()
+# yields suffixes that include every match.
+
+def _compile_shape(rule):
+    """Letters name digits: repeated letters must repeat, '?' is any digit.
+
+    With "distinct", different letters must also be different digits.
+    """
+    shape = rule["shape"]
+    if len(shape) != SUFFIX_DIGITS or not all(c == "?" or c.isalpha() for c in shape):
+        raise ValueError(f"shape must be {SUFFIX_DIGITS} letters or '?', got {shape!r}")
+    distinct = bool(rule.get("distinct", False))
+    positions = {}
+    for i, c in enumerate(shape):
+        if c != "?":
+            positions.setdefault(c, []).append(i)
+    groups = list(positions.values())
+    free = groups + [[i] for i, c in enumerate(shape) if c == "?"]
+
+    def matches(s):
+        if any(s[i] != s[group[0]] for group in groups for i in group[1:]):
+            return False
+        if distinct:
+            firsts = [s[group[0]] for group in groups]
+            return len(set(firsts)) == len(firsts)
+        return True
+
+    def vector_matches(d):
+        result = np.ones(len(d), dtype=bool)
+        for group in groups:
+            result &= (d[:, group] == d[:, group[:1]]).all(axis=1)
+        if distinct:
+            for a in range(len(groups)):
+                for b in range(a + 1, len(groups)):
+                    result &= d[:, groups[a][0]] != d[:, groups[b][0]]
+        return result
+
+    def candidates():
+        digits = [0] * SUFFIX_DIGITS
+        for values in product(range(10), repeat=len(free)):
+            for group, value in zip(free, values):
+                for i in group:
+                    digits[i] = value
+            yield _suffix(digits)
+
+    return matches, vector_matches, candidates
+
+
+def _compile_sequence(rule):
+    """Each digit is the previous one plus "step"."""
+    step = int(rule["step"])
+    return (lambda s: is_sequential(s, step),
+            lambda d: (np.diff(d, axis=1) == step).all(axis=1),
+            lambda: (_suffix(digits) for digits in (_arithmetic(a, step, SUFFIX_DIGITS) for a in range(10))
+                     if digits))
+
+
+def _compile_triplet_difference(rule):
+    """The two halves, read as 3-digit numbers, differ by exactly "difference"."""
+    difference = int(rule["difference"])
+
+    def vector_matches(d):
+        return np.abs((d[:, :3] @ _POWERS[3:]) - (d[:, 3:] @ _POWERS[3:])) == difference
+
+    return (lambda s: abs(int(s[:3]) - int(s[3:])) == difference,
+            vector_matches,
+            lambda: (first * 1000 + second for first in range(1000)
+                     for second in (first - difference, first + difference) if 0 <= second < 1000))
+
+
+def _compile_pair_sequence(rule):
+    """Each overlapping pair, read as a number, is the previous pair plus "step"."""
+    step = int(rule["step"])
+
+    def matches(s):
+        pairs = _pairs(s)
+        return all(int(pairs[i]) == int(pairs[i-1]) + step for i in range(1, len(pairs)))
+
+    def candidates():
+        # The first two digits fix the rest: d[i+1] = 10*d[i-1] + d[i] + step - 10*d[i]
+        for a, b in product(range(10), repeat=2):
+            digits = [a, b]
+            while len(digits) < SUFFIX_DIGITS:
+                following = 10 * digits[-2] + digits[-1] + step - 10 * digits[-1]
+                if not 0 <= following <= 9:
+                    break
+                digits.append(following)
+            if len(digits) == SUFFIX_DIGITS:
+                yield _suffix(digits)
+
+    return (matches,
+            lambda d: (np.diff(d[:, :5] * 10 + d[:, 1:], axis=1) == step).all(axis=1),
+            candidates)
+
+
+def _compile_pair_digit_steps(rule):
+    """First digits of the overlapping pairs step by "first_step", second digits by "second_step".
+
+    The pairs overlap, so unless both steps are equal no suffix qualifies.
+    """
+    first_step, second_step = int(rule["first_step"]), int(rule["second_step"])
+
+    def matches(s):
+        pairs = _pairs(s)
+        return (all(int(pairs[i][0]) == int(pairs[i-1][0]) + first_step for i in range(1, len(pairs))) and
+                all(int(pairs[i][1]) == int(pairs[i-1][1]) + second_step for i in range(1, len(pairs))))
+
+    return (matches,
+            lambda d: ((np.diff(d[:, :5], axis=1) == first_step).all(axis=1) &
+                       (np.diff(d[:, 1:], axis=1) == second_step).all(axis=1)),
+            lambda: (_suffix(digits + [last]) for digits in (_arithmetic(a, first_step, 5) for a in range(10))
+                     if digits for last in range(10)))
+
+
+def _compile_ends_with(rule):
+    """The suffix ends with one of "endings"."""
+    endings = tuple(rule["endings"])
+    if not endings or not all(isinstance(e, str) and e.isascii() and e.isdigit() and len(e) <= SUFFIX_DIGITS
+                              for e in endings):
+        raise ValueError(f"endings must be 1-{SUFFIX_DIGITS} digit strings, got {list(endings)!r}")
+    by_length = {}
+    for ending in endings:
+        by_length.setdefault(len(ending), []).append(int(ending))
+
+    def vector_matches(d):
+        suffixes = d @ _POWERS
+        result = np.zeros(len(d), dtype=bool)
+        for length, values in by_length.items():
+            result |= np.isin(suffixes % 10 ** length, values)
+        return result
+
+    return (lambda s: any(s.endswith(ending) for ending in endings),
+            vector_matches,
+            lambda: (head * 10 ** len(ending) + int(ending) for ending in endings
+                     for head in range(10 ** (SUFFIX_DIGITS - len(ending)))))
+
+
+RULE_TYPES = {
+    "shape": _compile_shape,
+    "sequence": _compile_sequence,
+    "triplet_difference": _compile_triplet_difference,
+    "pair_sequence": _compile_pair_sequence,
+    "pair_digit_steps": _compile_pair_digit_steps,
+    "ends_with": _compile_ends_with,
+}
+
+# Expected JSON type of every rule parameter, checked before compiling
+RULE_FIELDS = {
+    "label": str,
+    "shape": str,
+    "distinct": bool,
+    "step": int,
+    "difference": int,
+    "first_step": int,
+    "second_step": int,
+    "endings": list,
+}
+
+_TYPE_NAMES = {str: "a string", bool: "true or false", int: "an integer", list: "a list"}
+
+
+def _check_type(field, value, expected):
+    # bool is an int subclass, but true/false is no step
+    if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+        raise ValueError(f'"{field}" must be {_TYPE_NAMES[expected]}, got {value!r}')
+
+
+class RuleSet:
+    """Rules compiled from their declarative form; the suffix table is built on first use.
+
+    Bit i of a suffix's mask is rule i, in file order, which is also the order
+    labels are reported in. A label may contain "{last_three}".
+    """
+
+    def __init__(self, definition):
+        rules = definition.get("rules") if isinstance(definition, dict) else None
+        if not isinstance(rules, list):
+            raise ValueError('expected an object with a "rules" list')
+        if len(rules) > MAX_RULES:
+            raise ValueError(f"at most {MAX_RULES} rules are supported, got {len(rules)}")
+        self.definition = definition
+        self.labels, self.names, self._compiled = [], [], []
+        for position, rule in enumerate(rules, start=1):
+            if not isinstance(rule, dict):
+                raise ValueError(f"rule {position}: expected an object, got {rule!r}")
+            if rule.get("type") not in RULE_TYPES:
+                raise ValueError(f"rule {position}: unknown type {rule.get('type')!r}, "
+                                 f"expected one of {', '.join(RULE_TYPES)}")
+            try:
+                for field, expected in RULE_FIELDS.items():
+                    if field in rule:
+                        _check_type(field, rule[field], expected)
+                label = rule["label"]
+                compiled = RULE_TYPES[rule["type"]](rule)
+                name = label.format(last_three="/".join(rule.get("endings", ())) or "…")
+            except KeyError as e:
+                raise ValueError(f"rule {position}: missing or unknown {e}") from None
+            except (TypeError, ValueError, IndexError) as e:
+                raise ValueError(f"rule {position}: {e}") from None
+            if name in self.names:
+                raise ValueError(f"rule {position}: duplicate label {label!r}")
+            self.labels.append(label)
+            self.names.append(name)
+            self._compiled.append(compiled)
+        vip_numbers = definition.get("vip_numbers", [])
+        _check_type("vip_numbers", vip_numbers, list)
+        for number in vip_numbers:
+            if not isinstance(number, (str, int)) or isinstance(number, bool):
+                raise ValueError(f'"vip_numbers" entries must be numbers or strings, got {number!r}')
+        self.vip_numbers = frozenset(clean_digits(str(number)) for number in vip_numbers)
+        self._table = None
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def table(self):
+        """Pattern bitmask for every suffix 000000-999999, indexed by its integer value."""
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    table = array('I', bytes(4 * SUFFIX_COUNT))
+                    for bit, (matches, _, candidates) in enumerate(self._compiled):
+                        for suffix in set(candidates()):
+                            if matches(f"{suffix:06d}"):
+                                table[suffix] |= 1 << bit
+                    self._table = table
+        return self._table
+
+    def suffix_mask(self, last_six):
+        """Pattern bitmask for a six-digit suffix string, evaluated rule by rule."""
+        mask = 0
+        for bit, (matches, _, _) in enumerate(self._compiled):
+            if matches(last_six):
+                mask |= 1 << bit
+        return mask
+
+    def vector_masks(self, digits):
+        """Pattern bitmasks for an (n, 6) digit matrix, one vectorized pass per rule."""
+        masks = np.zeros(len(digits), dtype=np.uint32)
+        for bit, (_, vector_matches, _) in enumerate(self._compiled):
+            masks[vector_matches(digits)] |= 1 << bit
+        return masks
+
+    def suffix_index(self, mask):
+        """Sorted int64 array of every suffix matching at least one rule in ``mask``."""
+        table = self.table()
+        with self._lock:
+            index = self._indexes.get(mask)
+            if index is not None:
+                self._indexes.move_to_end(mask, last=False)
+                return index
+        index = np.flatnonzero(np.frombuffer(table, dtype=np.uint32) & mask)
+        with self._lock:
+            self._indexes[mask] = index
+            self._indexes.move_to_end(mask, last=False)
+            while len(self._indexes) > SUFFIX_INDEX_CACHE_SIZE:
+                self._indexes.popitem()
+        return index
+
+
+def load_rules(path):
+    with open(path, encoding="utf-8") as f:
+        return RuleSet(json.load(f))
+
+
+_rules = None
+_rules_key = None
+_rules_checked = 0.0
+_rules_error = None
+_rules_lock = threading.Lock()
+
+
+def _rules_source():
+    """(path, mtime) of the rule file in force: the admin's override, else the bundled defaults."""
+    try:
+        return RULES_PATH, os.stat(RULES_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return DEFAULT_RULES_PATH, os.stat(DEFAULT_RULES_PATH).st_mtime_ns
+
+
+def current_rules():
+    """Return the compiled rules, re-reading the rules file at most once a second if it changed.
+
+    data/fancy_rules.json overrides the bundled defaults. A file that fails to
+    compile keeps the previous rules in force; see rules_error().
+    """
+    global _rules, _rules_key, _rules_checked, _rules_error
+    if _rules is not None and time.monotonic() - _rules_checked < RULES_CHECK_SECONDS:
+        return _rules
+    with _rules_lock:
+        key = None
+        try:
+            key = _rules_source()
+            if key != _rules_key:
+                _rules = load_rules(key[0])
+                _rules_error = None
+        except (OSError, ValueError) as e:
+            if _rules is None:
+                raise
+            _rules_error = f"{key[0] if key else RULES_PATH}: {e}"
+        # A file that failed stays failed until it changes; a failed stat is retried
+        _rules_key = key
+        _rules_checked = time.monotonic()
+        return _rules
+
+
+def rules_error():
+    """Why the rules file last failed to load, or None while it is in force."""
+    return _rules_error
+
+
+def save_rules(text, path=RULES_PATH):
+    """Validate and compile the JSON ``text``, then make it the live rule file.
+
+    Raises ValueError (json.JSONDecodeError included) without touching the
+    current rules if it does not compile.
+    """
+    global _rules, _rules_key, _rules_checked, _rules_error
+    ruleset = RuleSet(json.loads(text))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so a concurrent reload never sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if path == RULES_PATH:
+        with _rules_lock:
+            _rules, _rules_key, _rules_error = ruleset, (path, os.stat(path).st_mtime_ns), None
+            _rules_checked = time.monotonic()
+    return ruleset
+
+
+def reset_rules():
+    """Drop the admin's rule file so the bundled defaults apply again."""
+    global _rules_checked
+    with _rules_lock:
+        try:
+            os.remove(RULES_PATH)
+        except FileNotFoundError:
+            pass
+        _rules_checked = 0.0
+
+
+def rules_text():
+    """The JSON source of the rules in force, for editing."""
+    return json.dumps(current_rules().definition, indent=2)
+
+
+def rule_names():
+    """Rule labels as shown when picking patterns, in rule order."""
+    return list(current_rules().names)
+
+
+def suffix_table():
+    """The current rules' suffix table, building it on first use."""
+    return current_rules().table()
+
+
+def pattern_bits(names):
+    """Mask with the bits of the rule_names() in ``names`` set."""
+    names_in_force = current_rules().names
+    return sum(1 << names_in_force.index(name) for name in set(names) if name in names_in_force)
+
+
+def pattern_labels(mask, clean_number, rules=None):
+    """Labels for ``mask`` in policy order for the digits-only ``clean_number``."""
+    if not mask:
+        return []
+    rules = rules or current_rules()
+    labels = [f"Special VIP number ({clean_number})"] if mask & VIP_BIT else []
+    labels += [label.format(last_three=clean_number[-3:])
+               for bit, label in enumerate(rules.labels) if mask & (1 << bit)]
+    return labels
+
+
+def pattern_mask(clean_number, rules=None):
+    """Pattern bitmask for a digits-only number with at least six digits."""
+    rules = rules or current_rules()
+    last_six = clean_number[-SUFFIX_DIGITS:]
+    if _ASCII_SUFFIX.match(last_six):
+        mask = rules.table()[int(last_six)]
+    else:
+        # Other Unicode digits compare as characters, not values: no table entry
+        mask = rules.suffix_mask(last_six)
+    if clean_number in rules.vip_numbers:
+        mask |= VIP_BIT
+    return mask
+
+
+def is_fancy_number(phone_number, rules=None):
+    clean_number = clean_digits(phone_number)
+
+    # Get last 6 digits according to Lycamobile policy
+    if len(clean_number) < SUFFIX_DIGITS:
+        return False, TOO_SHORT
+
+    rules = rules or current_rules()
+    labels = pattern_labels(pattern_mask(clean_number, rules), clean_number, rules)
+    return bool(labels), ", ".join(labels) if labels else NOT_FANCY
+
+
+def digit_matrix(suffixes):
+    """(n, 6) matrix of the decimal digits of integer suffixes, most significant first."""
+    # int16 still holds the widest derived value (a triplet) and keeps comparisons cheap
+    return ((np.asarray(suffixes, dtype=np.int64)[:, None] // _POWERS) % 10).astype(np.int16)
+
+
+def is_fancy_number_batch(numbers, rules=None):
+    """Classify many numbers at once; returns (is_fancy, masks) as NumPy arrays.
+
+    ``numbers`` is a sequence or array of strings or integers. Non-digits are
+    stripped as is_fancy_number does, numbers shorter than six digits get an
+    empty mask, and ``pattern_labels(mask, clean_number)`` names the patterns.
+    """
+    rules = rules or current_rules()
+    values = np.asarray(numbers)
+    if values.ndim != 1:
+        values = values.reshape(-1)
+    if values.dtype.kind in "iu":
+        values = np.abs(values.astype(np.int64))
+        suffixes = values % SUFFIX_COUNT
+        valid = values >= SUFFIX_COUNT // 10
+        vip = np.isin(values, [int(number) for number in rules.vip_numbers if number])
+        fallback = np.zeros(len(values), dtype=bool)
+    else:
+        clean = [clean_digits(str(number)) for number in values]
+        last_six = np.array([number[-SUFFIX_DIGITS:] for number in clean], dtype=f"U{SUFFIX_DIGITS}")
+        valid = np.array([len(number) >= SUFFIX_DIGITS for number in clean], dtype=bool)
+        vip = np.array([number in rules.vip_numbers for number in clean], dtype=bool)
+        # UCS-4 code points straight from the string buffer: '0' is 48
+        codes = last_six.view(np.uint32).reshape(len(last_six), SUFFIX_DIGITS).astype(np.int64) - 48
+        fallback = valid & ((codes < 0) | (codes > 9)).any(axis=1)
+        codes[~valid | fallback] = 0
+        suffixes = codes @ _POWERS
+
+    masks = rules.vector_masks(digit_matrix(suffixes))
+    masks[~valid] = 0
+    # Other Unicode digits compare as characters, not values, like the scalar check
+    for i in np.flatnonzero(fallback):
+        masks[i] = rules.suffix_mask(str(last_six[i]))
+    masks[vip & valid] |= VIP_BIT
+    return masks != 0, masks
+
+
+def search_range(start, end, mask, limit=1000):
+    """Fancy numbers in [start, end] matching any rule in ``mask``; returns (total, numbers).
+
+    Every block of 10^6 consecutive numbers shares the same sorted suffix
+    index, so the total is counted with two binary searches and only the
+    first ``limit`` numbers are materialized, in ascending order. VIP numbers
+    are not searched for.
+    """
+    suffixes = current_rules().suffix_index(mask)
+    count = len(suffixes)
+    if count == 0 or end < start:
+        return 0, np.empty(0, dtype=np.int64)
+    first_block, last_block = start // SUFFIX_COUNT, end // SUFFIX_COUNT
+    begin = int(np.searchsorted(suffixes, start % SUFFIX_COUNT))
+    stop = int(np.searchsorted(suffixes, end % SUFFIX_COUNT, side="right"))
+    if first_block == last_block:
+        total = max(stop - begin, 0)
+    else:
+        total = (count - begin) + (last_block - first_block - 1) * count + stop
+
+    numbers, remaining, block = [], limit, first_block
+    while block <= last_block and remaining > 0:
+        found = suffixes[begin:stop if block == last_block else count][:remaining]
+        numbers.append(block * SUFFIX_COUNT + found)
+        remaining -= len(found)
+        block, begin = block + 1, 0
+    return total, np.concatenate(numbers) if numbers else np.empty(0, dtype=np.int64)
+
+
+def search_prefix(prefix, length, mask, limit=1000):
+    """Fancy ``length``-digit numbers starting with ``prefix``; returns (total, numbers as strings)."""
+    prefix = clean_digits(prefix)
+    if length < max(len(prefix), SUFFIX_DIGITS):
+        return 0, []
+    span = 10 ** (length - len(prefix))
+    start = int(prefix or 0) * span
+    total, numbers = search_range(start, start + span - 1, mask, limit)
+    return total, [f"{number:0{length}d}" for number in numbers]
@@ -0,0 +1,239 @@
+"""Scan number-range exports against the fancy-number policy.
+
+Streams a CSV/TXT file in chunks, classifies each chunk in a worker process
+with fancy_number.is_fancy_number_batch and appends the fancy numbers, with
+their pattern names, to an output CSV as chunks finish. At most a few chunks
+are in flight at once, so memory stays flat however large the input is.
+
+    python fancy_scan.py numbers.csv -o fancy.csv [--column 0] [--workers 4] [--header | --no-header]
+"""
+import argparse
+import csv
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import fancy_number
+
+SCAN_DIR = os.path.join("data", "fancy_scans")
+CHUNK_SIZE = 50000
+OUTPUT_HEADER = ("number", "last_six", "patterns")
+SCAN_RETENTION_SECONDS = 24 * 60 * 60
+# In-app jobs share the machine with the web server
+JOB_WORKERS = 2
+# Workers must not be forked from the threaded server: fork copies locks other
+# threads hold. forkserver forks them from a clean single-threaded process.
+MP_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def is_header(cell):
+    """True for a first-row cell that names the column rather than holding a number."""
+    return not fancy_number.clean_digits(cell)
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, column=0, header=None):
+    """Yield (numbers, bytes_read) for every ``chunk_size`` non-empty cells of ``column``.
+
+    ``header`` True skips the first non-empty cell, False keeps it, and None
+    skips it only when it holds no digits (see is_header).
+    """
+    consumed = 0
+
+    def lines(f):
+        nonlocal consumed
+        for raw in f:
+            consumed += len(raw)
+            yield raw.decode("utf-8", errors="replace")
+
+    with open(path, "rb") as f:
+        chunk = []
+        for row in csv.reader(lines(f)):
+            if len(row) > column and row[column].strip():
+                cell = row[column].strip()
+                if header is not False:
+                    skip = header or is_header(cell)
+                    header = False
+                    if skip:
+                        continue
+                chunk.append(cell)
+                if len(chunk) == chunk_size:
+                    yield chunk, consumed
+                    chunk = []
+        if chunk:
+            yield chunk, consumed
+
+
+@functools.lru_cache(maxsize=4)
+def compiled_rules(rules_json):
+    """RuleSet for a JSON rules definition, compiled once per worker process."""
+    return fancy_number.RuleSet(json.loads(rules_json))
+
+
+def scan_chunk(numbers, rules_json):
+    """(number, last_six, patterns) rows for the fancy numbers in ``numbers`` under ``rules_json``."""
+    rules = compiled_rules(rules_json)
+    fancy, masks = fancy_number.is_fancy_number_batch(numbers, rules)
+    rows = []
+    for i in fancy.nonzero()[0]:
+        clean = fancy_number.clean_digits(numbers[i])
+        labels = fancy_number.pattern_labels(int(masks[i]), clean, rules)
+        rows.append((numbers[i], clean[-fancy_number.SUFFIX_DIGITS:], ", ".join(labels)))
+    return len(numbers), rows
+
+
+def scan(input_path, output_path, workers=None, chunk_size=CHUNK_SIZE, column=0, header=None, progress=None):
+    """Scan ``input_path`` into ``output_path``; returns (rows scanned, fancy rows written).
+
+    ``progress(rows, matches, fraction)`` is called after every chunk, with
+    ``fraction`` the share of the input read so far. Output keeps input order,
+    and every chunk is checked against the rules in force when the scan began.
+    """
+    workers = workers or os.cpu_count() or 1
+    rules_json = json.dumps(fancy_number.current_rules().definition)
+    total_bytes = os.path.getsize(input_path) or 1
+    rows = matches = 0
+    context = multiprocessing.get_context(MP_START_METHOD)
+    with open(output_path, "w", newline="", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        writer = csv.writer(out)
+        writer.writerow(OUTPUT_HEADER)
+        pending = deque()
+
+        def drain_oldest():
+            nonlocal rows, matches
+            future, consumed = pending.popleft()
+            scanned, fancy_rows = future.result()
+            writer.writerows(fancy_rows)
+            out.flush()
+            rows += scanned
+            matches += len(fancy_rows)
+            if progress:
+                progress(rows, matches, consumed / total_bytes)
+
+        for numbers, consumed in read_chunks(input_path, chunk_size, column, header):
+            # Bound the chunks held in memory: wait for the oldest before reading on
+            if len(pending) >= 2 * workers:
+                drain_oldest()
+            pending.append((pool.submit(scan_chunk, numbers, rules_json), consumed))
+        while pending:
+            drain_oldest()
+    return rows, matches
+
+
+# --------------------------
+# In-app scan jobs
+# --------------------------
+#
+# Uploaded files are scanned off the request thread, one job at a time, and
+# the page polls the job's counters.
+
+class ScanJob:
+    def __init__(self, job_id, name, input_path, output_path):
+        self.id = job_id
+        self.name = name
+        self.input_path = input_path
+        self.output_path = output_path
+        self.status = "queued"
+        self.rows = 0
+        self.matches = 0
+        self.fraction = 0.0
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def update(self, rows, matches, fraction):
+        self.rows, self.matches, self.fraction = rows, matches, fraction
+
+    def run(self, workers, chunk_size, column, header):
+        self.status = "running"
+        self.started = time.time()
+        try:
+            scan(self.input_path, self.output_path, workers, chunk_size, column, header, progress=self.update)
+            self.fraction = 1.0
+            self.status = "done"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+            raise
+        finally:
+            self.finished = time.time()
+            if os.path.exists(self.input_path):
+                os.remove(self.input_path)
+
+
+_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fancy-scan")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def purge_old_outputs(scan_dir=SCAN_DIR, retention=SCAN_RETENTION_SECONDS):
+    """Delete result files older than ``retention`` seconds, and forget their jobs; returns how many."""
+    cutoff = time.time() - retention
+    removed = set()
+    for name in os.listdir(scan_dir):
+        path = os.path.join(scan_dir, name)
+        if name.endswith(".fancy.csv") and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed.add(path)
+    with _jobs_lock:
+        for job in list(_jobs.values()):
+            if job.output_path in removed or (job.finished is not None and job.finished < cutoff):
+                del _jobs[job.id]
+    return len(removed)
+
+
+def start_job(name, stream, workers=JOB_WORKERS, chunk_size=CHUNK_SIZE, column=0, header=None, scan_dir=SCAN_DIR):
+    """Copy the uploaded ``stream`` to disk and queue a scan of it; returns the ScanJob."""
+    os.makedirs(scan_dir, exist_ok=True)
+    purge_old_outputs(scan_dir)
+    job_id = uuid.uuid4().hex
+    input_path = os.path.join(scan_dir, f"{job_id}.input")
+    with open(input_path, "wb") as f:
+        for block in iter(lambda: stream.read(1 << 20), b""):
+            f.write(block)
+    job = ScanJob(job_id, name, input_path, os.path.join(scan_dir, f"{job_id}.fancy.csv"))
+    with _jobs_lock:
+        _jobs[job.id] = job
+    _job_executor.submit(job.run, workers, chunk_size, column, header)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV or TXT file, one number per row")
+    parser.add_argument("-o", "--output", required=True, help="CSV file for the fancy numbers")
+    parser.add_argument("--column", type=int, default=0, help="zero-based column holding the number")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="numbers per chunk")
+    parser.add_argument("--header", action=argparse.BooleanOptionalAction, default=None,
+                        help="whether the first row is a header (default: skip it if it holds no digits)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def report(rows, matches, fraction):
+        rate = rows / max(time.perf_counter() - started, 1e-9)
+        print(f"\r{fraction:6.1%}  {rows:,} scanned  {matches:,} fancy  {rate:,.0f} numbers/s",
+              end="", file=sys.stderr, flush=True)
+
+    rows, matches = scan(args.input, args.output, args.workers, args.chunk_size, args.column, args.header,
+                         progress=report)
+    print(f"\nScanned {rows:,} numbers in {time.perf_counter() - started:.1f}s; "
+          f"{matches:,} fancy written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
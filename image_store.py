@@ -0,0 +1,170 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+# --------------------------
+# Content-Addressed Image Store
+# --------------------------
+#
+# HOLD images live on disk named by the SHA-256 of their bytes, so identical
+# uploads share one file and SQLite only keeps metadata. Files are sharded by
+# the first two hex digits to keep directories small. Downscaled variants
+# ("<digest>.thumb.webp", "<digest>.display.webp") sit next to the original.
+
+IMAGE_DIR = os.path.join("data", "hold_images")
+# Originals stored or re-stored this recently are never collected: their row
+# may not be inserted yet
+GC_GRACE_SECONDS = 5 * 60
+
+# variant name -> (max width/height, WebP quality)
+VARIANTS = {
+    "thumb": ((480, 480), 70),
+    "display": ((1600, 1600), 85),
+}
+
+
+class ImageStore:
+    def __init__(self, root=IMAGE_DIR):
+        self.root = root
+        # Orders put() against garbage_collect() for the same digest
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def variant_path(self, digest, variant):
+        return f"{self.path_for(digest)}.{variant}.webp"
+
+    def best_path(self, digest, variant):
+        """The variant if it has been built yet, otherwise the original."""
+        path = self.variant_path(digest, variant)
+        return path if os.path.exists(path) else self.path_for(digest)
+
+    def _write_atomic(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, data):
+        """Store ``data`` once and return its hex SHA-256 digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        with self._lock:
+            if os.path.exists(path):
+                # Restart the grace period so a concurrent collection keeps it
+                os.utime(path)
+            else:
+                self._write_atomic(path, lambda f: f.write(data))
+        return digest
+
+    def build_variants(self, digest):
+        """Decode the original once and write every missing downscaled variant."""
+        missing = [name for name in VARIANTS if not os.path.exists(self.variant_path(digest, name))]
+        if not missing:
+            return
+        with Image.open(self.path_for(digest)) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            for name in missing:
+                max_size, quality = VARIANTS[name]
+                variant = image.copy()
+                variant.thumbnail(max_size, Image.LANCZOS)
+                self._write_atomic(self.variant_path(digest, name),
+                                   lambda f: variant.save(f, "WEBP", quality=quality, method=4))
+
+    def read(self, digest):
+        with open(self.path_for(digest), "rb") as f:
+            return f.read()
+
+    def digests(self):
+        """Every original's digest currently on disk."""
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if os.path.isdir(shard_dir):
+                for name in os.listdir(shard_dir):
+                    if "." not in name:
+                        yield name
+
+    def delete(self, digest):
+        for path in [self.path_for(digest)] + [self.variant_path(digest, name) for name in VARIANTS]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def garbage_collect(self, referenced, grace=GC_GRACE_SECONDS):
+        """Delete images (and their variants) not in ``referenced``; returns how many.
+
+        Originals stored within the last ``grace`` seconds are kept, so an
+        upload between put() and its row insert doesn't lose its file.
+        """
+        cutoff = time.time() - grace
+        removed = 0
+        for digest in list(self.digests()):
+            if digest in referenced:
+                continue
+            with self._lock:
+                if os.path.getmtime(self.path_for(digest)) < cutoff:
+                    self.delete(digest)
+                    removed += 1
+        return removed
+
+
+# Variants are built off the request thread so uploads return immediately.
+_variant_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-variants")
+_pending_variants = set()
+_failed_variants = set()
+_pending_lock = threading.Lock()
+
+
+def _build_variants(store, digest):
+    try:
+        store.build_variants(digest)
+    except Exception:
+        # Undecodable upload: keep serving the original, don't retry every rerun
+        with _pending_lock:
+            _failed_variants.add(digest)
+        raise
+    finally:
+        with _pending_lock:
+            _pending_variants.discard(digest)
+
+
+def submit_variants(digest, store=None):
+    """Queue variant generation for ``digest`` unless it is queued or failed before."""
+    store = store or get_store()
+    with _pending_lock:
+        if digest in _pending_variants or digest in _failed_variants:
+            return None
+        _pending_variants.add(digest)
+    return _variant_executor.submit(_build_variants, store, digest)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide store rooted at IMAGE_DIR."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ImageStore()
+    return _store
@@ -0,0 +1,156 @@
+"""Shift-start rush on the break slots: old check-then-insert vs break_engine.
+
+Every agent thread starts together and tries the slots in order until one
+accepts them (a double-click retries the same slot once), first with the
+app's original flow (COUNT(*) on one connection, INSERT on another, a short
+"think" gap in between for the click) and then with break_engine.book_seat.
+Reports throughput, "database is locked" errors and seats booked beyond
+capacity or twice by the same agent.
+
+    python scripts/bench_break_booking.py [--agents 45] [--slots 6] [--capacity 5]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import break_engine  # noqa: E402
+import db  # noqa: E402
+
+BOOKING_DATE = "2025-04-16"
+
+
+def build_database(path, slots, capacity, agents):
+    pool = db.ConnectionPool(path)
+    db.migrate(pool)
+    conn = pool.get()
+    conn.executemany(
+        "INSERT INTO breaks (break_name, start_time, end_time, max_users, created_by, timestamp) "
+        "VALUES (?, ?, ?, ?, 'admin', '2025-04-16 08:00:00')",
+        [(f"Break {i}", f"{10 + i}:00", f"{10 + i}:15", capacity) for i in range(slots)])
+    conn.executemany("INSERT OR IGNORE INTO users (id, username, password, role) VALUES (?, ?, '', 'agent')",
+                     [(1000 + i, f"bench agent {i}") for i in range(agents)])
+    conn.commit()
+    return pool
+
+
+def naive_book(path, break_id, user_id, username, think):
+    """The original flow: availability on one connection, the insert on another."""
+    conn = sqlite3.connect(path)
+    try:
+        (booked,) = conn.execute("SELECT COUNT(*) FROM break_bookings WHERE break_id = ? AND booking_date = ?",
+                                 (break_id, BOOKING_DATE)).fetchone()
+        max_users = conn.execute("SELECT max_users FROM breaks WHERE id = ?", (break_id,)).fetchone()[0]
+    finally:
+        conn.close()
+    if booked >= max_users:
+        return break_engine.FULL
+    time.sleep(think)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("INSERT INTO break_bookings (break_id, user_id, username, booking_date, timestamp) "
+                     "VALUES (?, ?, ?, ?, '2025-04-16 08:00:00')", (break_id, user_id, username, BOOKING_DATE))
+        conn.commit()
+        return break_engine.BOOKED
+    finally:
+        conn.close()
+
+
+def engine_book(pool, break_id, user_id, username, think):
+    time.sleep(think)
+    return break_engine.book_seat(pool.get(), break_id, user_id, username, BOOKING_DATE)
+
+
+def rush(book, slot_ids, agents):
+    errors = []
+    attempts = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(agents)
+
+    def agent(i):
+        user_id, username = 1000 + i, f"bench agent {i}"
+        start.wait()
+        for break_id in slot_ids:
+            status = None
+            # Impatient agents click twice
+            for _ in range(2 if i % 3 == 0 else 1):
+                try:
+                    status = book(break_id, user_id, username)
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+                    continue
+                finally:
+                    with lock:
+                        attempts[0] += 1
+            if status in (break_engine.BOOKED, break_engine.ALREADY_BOOKED):
+                return
+
+    threads = [threading.Thread(target=agent, args=(i,)) for i in range(agents)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return attempts[0], time.perf_counter() - began, errors
+
+
+def report(label, path, capacity, attempts, elapsed, errors):
+    conn = sqlite3.connect(path)
+    try:
+        over = conn.execute("""
+            SELECT IFNULL(SUM(n - ?), 0) FROM (
+                SELECT COUNT(*) AS n FROM break_bookings GROUP BY break_id, booking_date
+            ) WHERE n > ?
+        """, (capacity, capacity)).fetchone()[0]
+        duplicates = conn.execute("""
+            SELECT IFNULL(SUM(n - 1), 0) FROM (
+                SELECT COUNT(*) AS n FROM break_bookings GROUP BY break_id, booking_date, user_id
+            ) WHERE n > 1
+        """).fetchone()[0]
+        (booked,) = conn.execute("SELECT COUNT(*) FROM break_bookings").fetchone()
+    finally:
+        conn.close()
+    print(f"{label:<20} {attempts / elapsed:8.0f} attempts/s  {booked:4d} booked  "
+          f"{over:3d} overbooked  {duplicates:3d} duplicate  {len(errors):3d} locked errors")
+    return over + duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=45)
+    parser.add_argument("--slots", type=int, default=6)
+    parser.add_argument("--capacity", type=int, default=5)
+    parser.add_argument("--think-ms", type=float, default=1.0,
+                        help="delay between seeing a free seat and booking it")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    think = args.think_ms / 1000
+
+    print(f"{args.agents} agents, {args.slots} slots x {args.capacity} seats, {args.runs} runs each")
+    bad = 0
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "naive.db")
+            pool = build_database(path, args.slots, args.capacity, args.agents)
+            # The original schema had no uniqueness to fall back on
+            pool.get().execute("DROP INDEX idx_break_bookings_slot_user")
+            slot_ids = [row[0] for row in pool.get().execute("SELECT id FROM breaks ORDER BY id")]
+            pool.close_all()
+            report("check-then-insert", path, args.capacity,
+                   *rush(lambda *a: naive_book(path, *a, think), slot_ids, args.agents))
+
+            path = os.path.join(tmp, "engine.db")
+            pool = build_database(path, args.slots, args.capacity, args.agents)
+            bad += report("book_seat", path, args.capacity,
+                          *rush(lambda *a: engine_book(pool, *a, think), slot_ids, args.agents))
+            pool.close_all()
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
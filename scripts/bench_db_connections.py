@@ -0,0 +1,111 @@
+"""Per-rerun latency of connect-per-call vs the pooled connection layer.
+
+Replays the queries one rerun of the Requests page issues (killswitch
+banner, notifications, sidebar counters, then per card: killswitch checks
+and the comment thread) against a throwaway database.
+
+    python scripts/bench_db_connections.py --requests 200 --reruns 20
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import db  # noqa: E402
+
+
+def build_database(path, n_requests):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE requests (id INTEGER PRIMARY KEY AUTOINCREMENT, agent_name TEXT,
+            request_type TEXT, identifier TEXT, comment TEXT, timestamp TEXT,
+            completed INTEGER DEFAULT 0);
+        CREATE TABLE request_comments (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER, user TEXT, comment TEXT, timestamp TEXT);
+        CREATE TABLE mistakes (id INTEGER PRIMARY KEY AUTOINCREMENT, team_leader TEXT,
+            agent_name TEXT, ticket_id TEXT, error_description TEXT, timestamp TEXT);
+        CREATE TABLE group_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT,
+            message TEXT, timestamp TEXT, mentions TEXT);
+        CREATE TABLE system_settings (id INTEGER PRIMARY KEY DEFAULT 1,
+            killswitch_enabled INTEGER DEFAULT 0, chat_killswitch_enabled INTEGER DEFAULT 0);
+        INSERT INTO system_settings VALUES (1, 0, 0);
+    """)
+    ts = "2025-04-16 09:00:00"
+    conn.executemany(
+        "INSERT INTO requests (agent_name, request_type, identifier, comment, timestamp) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [(f"agent {i % 45}", "Email", f"id-{i}", "comment", ts) for i in range(n_requests)])
+    conn.executemany(
+        "INSERT INTO request_comments (request_id, user, comment, timestamp) VALUES (?, ?, ?, ?)",
+        [(i + 1, "admin", "update", ts) for i in range(n_requests) for _ in range(2)])
+    conn.executemany(
+        "INSERT INTO group_messages (sender, message, timestamp, mentions) VALUES (?, ?, ?, ?)",
+        [("agent", "hello", ts, "") for _ in range(50)])
+    conn.commit()
+    conn.close()
+
+
+def simulate_rerun(get_connection):
+    """Issue the same query sequence as one rerun of the Requests page."""
+    def query(sql, params=()):
+        conn = get_connection()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    killswitch = "SELECT killswitch_enabled FROM system_settings WHERE id = 1"
+    query(killswitch)
+    for _ in range(2):
+        query("SELECT * FROM requests ORDER BY timestamp DESC")
+        query("SELECT * FROM mistakes ORDER BY timestamp DESC")
+        query("SELECT * FROM group_messages ORDER BY timestamp DESC LIMIT 50")
+    query(killswitch)
+    for (req_id, *_rest) in query("SELECT * FROM requests ORDER BY timestamp DESC"):
+        query(killswitch)
+        query("SELECT * FROM request_comments WHERE request_id = ? ORDER BY timestamp ASC",
+              (req_id,))
+        query(killswitch)
+
+
+def measure(label, get_connection, reruns):
+    simulate_rerun(get_connection)  # warm the page cache
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        simulate_rerun(get_connection)
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<22} median {statistics.median(samples):8.2f} ms   "
+          f"p95 {sorted(samples)[int(len(samples) * 0.95) - 1]:8.2f} ms")
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "requests.db")
+        build_database(path, args.requests)
+
+        def connect_per_call():
+            os.makedirs(tmp, exist_ok=True)
+            return sqlite3.connect(path)
+
+        pool = db.ConnectionPool(path)
+        print(f"{args.requests} request cards, {args.reruns} reruns")
+        before = measure("connect per call", connect_per_call, args.reruns)
+        after = measure("pooled connection", pool.get, args.reruns)
+        print(f"speedup                {before / after:8.1f}x")
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
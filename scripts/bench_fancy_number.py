@@ -0,0 +1,116 @@
+"""Throughput of every fancy-number code path, plus the cold-start build.
+
+Classifies the same random sample of phone numbers (11-digit strings, with
+separators on some) through the frozen original check, the table-backed
+is_fancy_number, a raw table lookup, and is_fancy_number_batch on strings
+and on an int64 array, and times compiling the bundled rules and building
+their suffix table from scratch. --save writes the results as JSON;
+--compare fails the run if any path got slower than a saved baseline by
+more than --tolerance.
+
+    python scripts/bench_fancy_number.py [--numbers 200000] [--runs 5] [--save bench.json]
+    python scripts/bench_fancy_number.py --compare bench.json [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+import fancy_number  # noqa: E402
+import fancy_reference  # noqa: E402
+
+
+def sample_numbers(count, seed=7):
+    rng = random.Random(seed)
+    numbers = []
+    for i in range(count):
+        digits = f"447{rng.randrange(10 ** 8):08d}"
+        numbers.append(f"+{digits[:2]} {digits[2:6]} {digits[6:]}" if i % 4 == 0 else digits)
+    return numbers
+
+
+def best_time(run, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return min(samples)
+
+
+def cold_start():
+    rules = fancy_number.load_rules(fancy_number.DEFAULT_RULES_PATH)
+    rules.table()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--numbers", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=5, help="repetitions; the best run counts")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    numbers = sample_numbers(args.numbers)
+    integers = np.array([int(fancy_number.clean_digits(number)) for number in numbers], dtype=np.int64)
+    rules = fancy_number.load_rules(fancy_number.DEFAULT_RULES_PATH)
+    table = rules.table()
+
+    def table_lookup():
+        for number in numbers:
+            table[int(fancy_number.clean_digits(number)[-6:])]
+
+    # name -> callable classifying every sample number once
+    paths = {
+        "reference (original)": lambda: [fancy_reference.is_fancy_number(n) for n in numbers],
+        "is_fancy_number": lambda: [fancy_number.is_fancy_number(n, rules) for n in numbers],
+        "table lookup": table_lookup,
+        "batch (strings)": lambda: fancy_number.is_fancy_number_batch(numbers, rules),
+        "batch (int64)": lambda: fancy_number.is_fancy_number_batch(integers, rules),
+    }
+
+    print(f"{args.numbers:,} numbers, best of {args.runs} runs")
+    results = {}
+    for name, run in paths.items():
+        results[name] = args.numbers / best_time(run, args.runs)
+        print(f"{name:<22} {results[name]:14,.0f} numbers/s")
+    builds = [best_time(cold_start, 1) for _ in range(args.runs)]
+    results["cold start ms"] = statistics.median(builds) * 1000
+    print(f"{'cold start (compile + table)':<30} {results['cold start ms']:8.1f} ms median")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, value in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            # Throughputs must not drop; the build time must not grow
+            slower = value > before * (1 + args.tolerance) if name.endswith(" ms") \
+                else value < before * (1 - args.tolerance)
+            if slower:
+                regressions.append(f"{name}: {before:,.1f} -> {value:,.1f}")
+        print(f"{len(regressions)} regressions against {args.compare}")
+        for regression in regressions:
+            print(f"  {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Fail if the fancy-number checker disagrees with the golden corpus.
+
+The corpus (fancy_golden.csv.gz, next to this script) holds the exact
+(is_fancy, reason) the original check returned for every six-digit suffix
+000000-999999, plus EXTRA_NUMBERS covering VIP numbers, separators, short
+input and non-ASCII digits. It is generated once from the frozen copy in
+fancy_reference.py. Every row is checked through the scalar lookup, the
+NumPy batch path and the table/vector agreement, using the bundled rules
+(or --rules), and the checker's POLICY_EXAMPLES must agree with it too.
+
+    python scripts/check_fancy_golden.py [--rules fancy_rules.json] [--regenerate]
+"""
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import fancy_number  # noqa: E402
+
+CORPUS_PATH = os.path.join(HERE, "fancy_golden.csv.gz")
+SHOW_MISMATCHES = 10
+
+EXTRA_NUMBERS = [
+    "13322866688", "+1 332-286-6688", "133 2286 6688", "0013322866688",
+    "447900566655", "0044-7900-112233", "44 (207) 123-456", "7900000123", "16109055580",
+    "12345", "55555", "", "abc", "+44",
+    "٤٤٤٥٥٥", "٠١٢٣٤٥", "1٢٣456", "99٩999", "44790٥٥٥", "٩٨٧٦٥٤",
+]
+
+
+def regenerate(path):
+    sys.path.insert(0, HERE)
+    import fancy_reference
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(["number", "is_fancy", "reason"])
+    for number in [f"{suffix:06d}" for suffix in range(fancy_number.SUFFIX_COUNT)] + EXTRA_NUMBERS:
+        is_fancy, reason = fancy_reference.is_fancy_number(number)
+        writer.writerow([number, int(is_fancy), reason])
+    # mtime=0 keeps the file byte-identical across regenerations
+    with open(path, "wb") as f:
+        f.write(gzip.compress(buf.getvalue().encode("utf-8"), compresslevel=9, mtime=0))
+
+
+def load_corpus(path):
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [(number, is_fancy == "1", reason) for number, is_fancy, reason in reader]
+
+
+def report(label, mismatches):
+    print(f"{'FAIL' if mismatches else 'ok  '} {label}: {len(mismatches)} mismatches")
+    for number, expected, got in mismatches[:SHOW_MISMATCHES]:
+        print(f"       {number!r}: expected {expected!r}, got {got!r}")
+    return len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", default=fancy_number.DEFAULT_RULES_PATH, help="rules file to check")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="rewrite the corpus from fancy_reference.py first")
+    args = parser.parse_args()
+
+    if args.regenerate:
+        regenerate(CORPUS_PATH)
+    corpus = load_corpus(CORPUS_PATH)
+    rules = fancy_number.load_rules(args.rules)
+    numbers = [number for number, _, _ in corpus]
+    print(f"{len(corpus):,} golden rows, rules from {os.path.relpath(args.rules)}")
+
+    failures = report("scalar is_fancy_number", [
+        (number, (is_fancy, reason), got) for number, is_fancy, reason in corpus
+        if (got := fancy_number.is_fancy_number(number, rules)) != (is_fancy, reason)])
+
+    fancy, masks = fancy_number.is_fancy_number_batch(numbers, rules)
+    batch_mismatches = []
+    for (number, is_fancy, reason), got_fancy, mask in zip(corpus, fancy, masks):
+        labels = fancy_number.pattern_labels(int(mask), fancy_number.clean_digits(number), rules)
+        # The batch API only reports patterns; the no-match reasons are the scalar check's
+        if bool(got_fancy) != is_fancy or (is_fancy and ", ".join(labels) != reason):
+            batch_mismatches.append((number, (is_fancy, reason), (bool(got_fancy), ", ".join(labels))))
+    failures += report("is_fancy_number_batch", batch_mismatches)
+
+    table = np.frombuffer(rules.table(), dtype=np.uint32)
+    vector = rules.vector_masks(fancy_number.digit_matrix(np.arange(fancy_number.SUFFIX_COUNT)))
+    failures += report("suffix table vs vectorized rules", [
+        (f"{suffix:06d}", int(table[suffix]), int(vector[suffix]))
+        for suffix in np.flatnonzero(table != vector)])
+
+    expected = {number: is_fancy for number, is_fancy, _ in corpus}
+    failures += report("POLICY_EXAMPLES", [
+        (number, golden, claimed) for number, claimed, _ in fancy_number.POLICY_EXAMPLES
+        if (golden := expected.get(number, expected.get(fancy_number.clean_digits(number)[-6:]))) != claimed])
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
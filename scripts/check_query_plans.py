@@ -0,0 +1,183 @@
+"""Fail if a hot query in the app falls back to a full table scan.
+
+Builds a throwaway database with the real migrations and managed indexes,
+fills it with a large synthetic dataset, runs ANALYZE, then pulls every
+literal SQL string passed to ``execute()`` out of SOURCE_PATHS with ``ast`` and
+runs ``EXPLAIN QUERY PLAN`` on it. A plan step that scans a table outside
+SMALL_TABLES fails the run when it is a bare ``SCAN <table>``, or an index
+scan in a statement whose outer query has a WHERE clause (the filter is applied row by row
+over the whole table). An unfiltered scan that walks an index in ORDER BY order and
+stops at a LIMIT (no temp B-tree sort) only reads the rows it returns and passes.
+Functions listed in WHOLE_TABLE_FUNCTIONS are exempt.
+
+    python scripts/check_query_plans.py [--rows 100000] [--verbose]
+"""
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+
+# Modules whose SQL is checked: the app and the engines it delegates to.
+SOURCE_PATHS = [os.path.join(ROOT, name) for name in ("USA FORM.py", "break_engine.py")]
+
+# Configuration tables that stay tiny; scanning them is cheaper than an index.
+SMALL_TABLES = {"breaks", "system_settings"}
+
+# Functions that touch every row by design (admin wipes, full exports).
+WHOLE_TABLE_FUNCTIONS = {
+    "get_all_users",
+    "auto_schedule",
+    "clear_hold_images",
+    "clear_all_requests",
+    "clear_all_mistakes",
+    "clear_all_group_messages",
+    "get_chat_archive_stats",
+    "clear_all_break_bookings",
+    "clear_late_logins",
+    "clear_quality_issues",
+    "clear_midshift_issues",
+}
+
+SCAN_STEP = re.compile(r"^SCAN (\w+)(?: AS \w+)?(?P<index> USING (?:COVERING )?INDEX \w+)?$")
+WHERE_CLAUSE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+LIMIT_CLAUSE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+PARENTHESIZED = re.compile(r"\([^()]*\)")
+TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|JOIN|ON|LEFT|INNER|ORDER|GROUP|LIMIT)(\w+))?",
+                         re.IGNORECASE)
+
+
+def populate(conn, rows):
+    rng = random.Random(42)
+    agents = [f"Agent {i}" for i in range(400)]
+    conn.executemany("INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, 'agent')",
+                     [(name, db.hash_password(name)) for name in agents])
+
+    def stamp(i):
+        return f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:{i % 59:02d}"
+
+    def epoch(i):
+        return 1735689600 + i * 37
+
+    conn.executemany(
+        "INSERT INTO requests (agent_name, request_type, identifier, comment, timestamp, completed, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(rng.choice(agents), rng.choice(["Email", "Phone", "Ticket"]), f"ID{i}",
+          f"comment {i}", stamp(i), i % 3 == 0, epoch(i)) for i in range(rows)])
+    conn.executemany(
+        "INSERT INTO request_comments (request_id, user, comment, timestamp) VALUES (?, ?, ?, ?)",
+        [(1 + i % rows, rng.choice(agents), "update", stamp(i)) for i in range(rows * 2)])
+    conn.executemany(
+        "INSERT INTO mistakes (team_leader, agent_name, ticket_id, error_description, timestamp, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [("lead", rng.choice(agents), f"T{i}", "wrong", stamp(i), epoch(i)) for i in range(rows // 2)])
+    conn.executemany(
+        "INSERT INTO group_messages (sender, message, timestamp, created_at, mentions) VALUES (?, ?, ?, ?, ?)",
+        [(rng.choice(agents), f"message {i}", stamp(i), epoch(i), "") for i in range(rows // 2)])
+    conn.executemany(
+        "INSERT INTO breaks (break_name, start_time, end_time, max_users, created_by, timestamp) "
+        "VALUES (?, ?, ?, ?, 'admin', ?)",
+        [(f"Break {i}", f"{8 + i // 4:02d}:{i % 4 * 15:02d}", f"{8 + i // 4:02d}:{i % 4 * 15 + 14:02d}",
+          5, stamp(i)) for i in range(30)])
+    conn.executemany(
+        "INSERT OR IGNORE INTO break_bookings (break_id, user_id, username, booking_date, timestamp) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [(1 + i % 30, 1 + i % 400, rng.choice(agents), f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+          stamp(i)) for i in range(rows)])
+    for table, columns in (
+        ("late_logins", "(agent_name, presence_time, login_time, reason, timestamp, created_at)"),
+        ("quality_issues", "(agent_name, issue_type, timing, mobile_number, product, timestamp, created_at)"),
+        ("midshift_issues", "(agent_name, issue_type, start_time, end_time, timestamp, created_at)"),
+    ):
+        width = columns.count(",") + 1
+        conn.executemany(
+            f"INSERT INTO {table} {columns} VALUES ({', '.join('?' * width)})",
+            [(rng.choice(agents),) + ("08:30",) * (width - 3) + (stamp(i), epoch(i)) for i in range(rows // 4)])
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def extract_queries(path):
+    """Yield (function, lineno, sql) for every literal SQL string passed to execute()."""
+    tree = ast.parse(open(path, encoding="utf-8").read(), path)
+    owners = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            for child in ast.walk(node):
+                owners.setdefault(id(child), node.name)
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ("execute", "executemany") and node.args
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            yield owners.get(id(node), "<module>"), node.lineno, node.args[0].value
+
+
+def has_where_clause(sql):
+    """True if the outer statement filters; WHEREs inside subqueries don't count."""
+    while PARENTHESIZED.search(sql):
+        sql = PARENTHESIZED.sub("", sql)
+    return bool(WHERE_CLAUSE.search(sql))
+
+
+def explain(conn, sql):
+    sql = sql.strip()
+    if not re.match(r"(SELECT|UPDATE|DELETE|WITH)\b", sql, re.IGNORECASE):
+        return None
+    params = (None,) * sql.count("?")
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = db.ConnectionPool(os.path.join(tmp, "requests.db"))
+        db.migrate(pool)
+        conn = pool.get()
+        populate(conn, args.rows)
+
+        checked = 0
+        queries = [(os.path.basename(path), *query)
+                   for path in SOURCE_PATHS for query in extract_queries(path)]
+        for source, function, lineno, sql in queries:
+            plan = explain(conn, sql)
+            if plan is None:
+                continue
+            checked += 1
+            filtered = has_where_clause(sql)
+            bounded = (not filtered and LIMIT_CLAUSE.search(sql)
+                       and not any("TEMP B-TREE" in step for step in plan))
+            aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql) if alias}
+            scans = [step for step in plan
+                     if (m := SCAN_STEP.match(step))
+                     and aliases.get(m.group(1), m.group(1)) not in SMALL_TABLES
+                     and (not m.group("index") or filtered)]
+            failed = bool(scans) and not bounded and function not in WHOLE_TABLE_FUNCTIONS
+            if failed:
+                failures.append((source, function, lineno, scans))
+            if args.verbose or failed:
+                print(f"{'FAIL' if failed else 'ok  '} {source}:{function} (line {lineno})")
+                for step in plan:
+                    print(f"       {step}")
+        pool.close_all()
+
+    print(f"{checked} queries checked, {len(failures)} full-scan regressions")
+    for source, function, lineno, scans in failures:
+        print(f"  {source}:{function} (line {lineno}): {', '.join(scans)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())